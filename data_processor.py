@@ -1,18 +1,153 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import re
-from datetime import datetime
+import os
+import heapq
+import shutil
+import struct
+import tempfile
 from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
 import argparse
+import threading
+from typing import NamedTuple, Optional
+
+from log_common import DIALECTS, DialectMatcher, DuplicateEventFilter
+
+# 内存中每个客户端事件(字典+字符串)除原始行以外的近似开销，用于估算内存预算
+EVENT_OVERHEAD_BYTES = 600
+
+class ExternalEventSorter:
+    """外部排序：超出内存预算时把客户端事件按 (client, 时间) 排好序溢写为临时文件，再做k路归并"""
+    
+    # epoch, seq, event, len(client), len(timestamp), len(vap), len(reason_code), len(original_line)
+    RECORD_HEADER = struct.Struct('<qqBHHHHI')
+    EVENT_CODES = {'assoc': 0, 'disassoc': 1}
+    EVENT_NAMES = ('assoc', 'disassoc')
+    
+    def __init__(self, max_memory_bytes, temp_dir=None):
+        self.max_memory_bytes = max_memory_bytes
+        self.temp_dir = temp_dir
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.run_files = []
+        self.seq = 0
+        self.workdir = None
+    
+    def add(self, event):
+        """加入一个客户端事件，超出预算时溢写"""
+        # seq 保证同一时间戳的事件保持原始文件顺序（与内存中的稳定排序一致）
+        self.buffer.append((event['client'], event['epoch'], self.seq, event))
+        self.seq += 1
+        self.buffer_bytes += len(event['original_line']) + EVENT_OVERHEAD_BYTES
+        if self.buffer_bytes >= self.max_memory_bytes:
+            self.spill()
+    
+    def spill(self):
+        """把当前缓冲区排序后写成一个有序run文件"""
+        if self.workdir is None:
+            self.workdir = tempfile.TemporaryDirectory(prefix='wifi_sort_', dir=self.temp_dir)
+        
+        # (client, epoch, seq) 唯一，比较不会落到事件字典上
+        self.buffer.sort()
+        path = os.path.join(self.workdir.name, f'run_{len(self.run_files):06d}.bin')
+        with open(path, 'wb') as f:
+            for _, epoch, seq, event in self.buffer:
+                f.write(self.encode(epoch, seq, event))
+        self.run_files.append(path)
+        self.buffer = []
+        self.buffer_bytes = 0
+    
+    def encode(self, epoch, seq, event):
+        """紧凑二进制编码：定长头 + UTF-8字符串"""
+        fields = [event[key].encode('utf-8') for key in ('client', 'timestamp', 'vap', 'reason_code', 'original_line')]
+        header = self.RECORD_HEADER.pack(epoch, seq, self.EVENT_CODES[event['event']], *(len(field) for field in fields))
+        return header + b''.join(fields)
+    
+    def read_run(self, path):
+        """按顺序读取一个run文件，产出 (client, epoch, seq, event)"""
+        header_size = self.RECORD_HEADER.size
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(header_size)
+                if not header:
+                    break
+                epoch, seq, event_code, *lengths = self.RECORD_HEADER.unpack(header)
+                client, timestamp, vap, reason_code, original_line = (f.read(length).decode('utf-8') for length in lengths)
+                yield client, epoch, seq, {
+                    'type': 'client_event',
+                    'timestamp': timestamp,
+                    'epoch': epoch,
+                    'client': client,
+                    'event': self.EVENT_NAMES[event_code],
+                    'vap': vap,
+                    'reason_code': reason_code,
+                    'original_line': original_line
+                }
+    
+    def iter_sorted(self):
+        """按 (client, 时间, 原始顺序) 产出全部事件"""
+        if not self.run_files:
+            # 未超出预算，直接在内存中排序
+            self.buffer.sort()
+            for _, _, _, event in self.buffer:
+                yield event
+            return
+        
+        if self.buffer:
+            self.spill()
+        runs = [self.read_run(path) for path in self.run_files]
+        for _, _, _, event in heapq.merge(*runs):
+            yield event
+    
+    def close(self):
+        if self.workdir is not None:
+            self.workdir.cleanup()
+            self.workdir = None
+
+def make_session(client, assoc_event, disassoc_event):
+    """由assoc/disassoc事件构造会话记录，缺失的一端留空"""
+    return {
+        'client': client,
+        'assoc_time': assoc_event['timestamp'] if assoc_event else '',
+        'assoc_epoch': assoc_event['epoch'] if assoc_event else None,
+        'assoc_vap': assoc_event['vap'] if assoc_event else '',
+        'disassoc_time': disassoc_event['timestamp'] if disassoc_event else '',
+        'disassoc_epoch': disassoc_event['epoch'] if disassoc_event else None,
+        'disassoc_vap': disassoc_event['vap'] if disassoc_event else '',
+        'reason_code': disassoc_event['reason_code'] if disassoc_event else '',
+        'assoc_line': assoc_event['original_line'] if assoc_event else '',
+        'disassoc_line': disassoc_event['original_line'] if disassoc_event else ''
+    }
 
 class WiFiLogProcessor:
-    def __init__(self, include_system_events=True):
+    def __init__(self, include_system_events=True, max_memory=None, temp_dir=None, dedup_window=None,
+                 dialect='auto'):
         self.client_sessions = defaultdict(list)
         self.reason_lines = []
         self.skip_lines = []
         self.other_lines = []
         self.include_system_events = include_system_events
+        self.temp_dir = temp_dir
+        
+        # 外部排序模式：max_memory 为字节数，客户端事件占一半预算，其余留给系统事件行
+        self.event_sorter = None
+        self.system_spools = None
+        if max_memory:
+            self.event_sorter = ExternalEventSorter(max_memory // 2, temp_dir)
+            self.system_spools = {
+                event_type: tempfile.SpooledTemporaryFile(max_size=max_memory // 6, mode='w+', encoding='utf-8', dir=temp_dir)
+                for event_type in ('system_reason', 'skip', 'other')
+            }
+            self.system_counts = {event_type: 0 for event_type in self.system_spools}
+        
+        # 日志方言：'auto' 时按行首分派所有已注册方言，并在 process_file 中检测文件开头的方言
+        self.dialect = dialect
+        self.matcher = DialectMatcher(None if dialect == 'auto' else dialect)
+        
+        # 配对前的重复事件过滤，dedup_window 为秒数
+        self.dedup_filter = DuplicateEventFilter(dedup_window) if dedup_window else None
         
     def parse_line(self, line):
         """解析单行日志"""
@@ -20,46 +155,48 @@ class WiFiLogProcessor:
         if not line:
             return None
             
-        # 匹配时间戳
-        time_match = re.search(r'(\w+ \w+ \d+ \d+:\d+:\d+)', line)
-        if not time_match:
+        # 按方言匹配时间戳和事件字段
+        dialect, match = self.matcher.match(line)
+        if match is None:
             return None
             
-        timestamp = time_match.group(1)
+        # 规范时间戳文本用于报告，epoch 保留年份，用于排序、溢写和去重
+        # 时间戳格式对但不是有效日期(如星期名损坏、2月30日)的行按无法解析处理
+        try:
+            timestamp, epoch = dialect.event_time(match)
+        except ValueError:
+            return None
         
         # 匹配客户端相关事件
-        client_match = re.search(r'reported client=\[([^\]]+)\] (assoc|disassoc)', line)
-        if client_match:
-            client_mac = client_match.group(1)
-            event_type = client_match.group(2)
-            
-            # 获取vap信息
-            vap_match = re.search(r'on vap=\[([^\]]+)\]', line)
-            vap = vap_match.group(1) if vap_match else ""
+        client_mac, event_marker, vap, reason = match.group('client', 'event', 'vap', 'reason_code')
+        if client_mac is not None:
+            event_type = dialect.event_names[event_marker]
             
             # 获取断连原因
             reason_code = ""
             if event_type == "disassoc":
-                reason_match = re.search(r'reason code=\[(\d+)\]', line)
-                reason_code = reason_match.group(1) if reason_match else ""
+                reason_code = reason or ""
             
             return {
                 'type': 'client_event',
                 'timestamp': timestamp,
+                'epoch': epoch,
                 'client': client_mac,
                 'event': event_type,
-                'vap': vap,
+                'vap': vap or "",
                 'reason_code': reason_code,
                 'original_line': line
             }
         
         # 匹配reason行（系统参数变化）
-        elif self.include_system_events and 'reason=' in line and 'oldCh->newCh' in line:
-            return {
+        elif self.include_system_events and match.group('config_reason') is not None:
+            parsed = {
                 'type': 'system_reason',
                 'timestamp': timestamp,
                 'original_line': line
             }
+            parsed.update(dialect.config_fields(match))
+            return parsed
         
         # 匹配skip行
         elif self.include_system_events and 'skip' in line.lower():
@@ -70,7 +207,7 @@ class WiFiLogProcessor:
             }
         
         # 其他类型的行（可选记录）
-        elif self.include_system_events and not ('reason=' in line and 'oldCh->newCh' in line) and 'skip' not in line.lower():
+        elif self.include_system_events:
             return {
                 'type': 'other',
                 'timestamp': timestamp,
@@ -81,12 +218,22 @@ class WiFiLogProcessor:
     
     def process_file(self, input_file):
         """处理输入文件"""
+        if self.dialect == 'auto':
+            self.matcher.detect_file(input_file)
         with open(input_file, 'r', encoding='utf-8', errors='ignore') as f:
             for line in f:
                 parsed = self.parse_line(line)
                 if parsed:
                     if parsed['type'] == 'client_event':
-                        self.client_sessions[parsed['client']].append(parsed)
+                        if self.dedup_filter is not None and self.dedup_filter.is_duplicate_event(parsed):
+                            continue
+                        if self.event_sorter is not None:
+                            self.event_sorter.add(parsed)
+                        else:
+                            self.client_sessions[parsed['client']].append(parsed)
+                    elif self.system_spools is not None:
+                        self.system_spools[parsed['type']].write(f"{parsed['timestamp']}: {parsed['original_line']}\n")
+                        self.system_counts[parsed['type']] += 1
                     elif parsed['type'] == 'system_reason':
                         self.reason_lines.append(parsed)
                     elif parsed['type'] == 'skip':
@@ -94,184 +241,376 @@ class WiFiLogProcessor:
                     elif parsed['type'] == 'other':
                         self.other_lines.append(parsed)
     
+    def system_event_counts(self):
+        """返回 (系统参数变更, skip事件, 其他事件) 的条数"""
+        if self.system_spools is not None:
+            return (self.system_counts['system_reason'], self.system_counts['skip'], self.system_counts['other'])
+        return len(self.reason_lines), len(self.skip_lines), len(self.other_lines)
+    
+    def duplicate_count(self):
+        """被重复事件过滤丢弃的客户端事件条数"""
+        return self.dedup_filter.dropped if self.dedup_filter is not None else 0
+    
     def pair_sessions(self):
         """配对每个客户端的assoc和disassoc事件"""
         paired_sessions = []
         
         for client, events in self.client_sessions.items():
-            # 按时间排序
-            events.sort(key=lambda x: datetime.strptime(x['timestamp'], '%a %b %d %H:%M:%S'))
-            
-            i = 0
-            while i < len(events):
-                current_event = events[i]
-                
-                if current_event['event'] == 'assoc':
-                    # 寻找对应的disassoc事件
-                    j = i + 1
-                    while j < len(events) and events[j]['event'] != 'disassoc':
-                        j += 1
-                    
-                    if j < len(events):
-                        # 找到配对的disassoc
-                        disassoc_event = events[j]
-                        paired_sessions.append({
-                            'client': client,
-                            'assoc_time': current_event['timestamp'],
-                            'assoc_vap': current_event['vap'],
-                            'disassoc_time': disassoc_event['timestamp'],
-                            'disassoc_vap': disassoc_event['vap'],
-                            'reason_code': disassoc_event['reason_code'],
-                            'assoc_line': current_event['original_line'],
-                            'disassoc_line': disassoc_event['original_line']
-                        })
-                        i = j + 1
-                    else:
-                        # 没有找到配对的disassoc，可能是未完成的连接
-                        paired_sessions.append({
-                            'client': client,
-                            'assoc_time': current_event['timestamp'],
-                            'assoc_vap': current_event['vap'],
-                            'disassoc_time': '',
-                            'disassoc_vap': '',
-                            'reason_code': '',
-                            'assoc_line': current_event['original_line'],
-                            'disassoc_line': ''
-                        })
-                        i += 1
-                else:
-                    # 如果是单独的disassoc（没有对应的assoc），也记录
-                    paired_sessions.append({
-                        'client': client,
-                        'assoc_time': '',
-                        'assoc_vap': '',
-                        'disassoc_time': current_event['timestamp'],
-                        'disassoc_vap': current_event['vap'],
-                        'reason_code': current_event['reason_code'],
-                        'assoc_line': '',
-                        'disassoc_line': current_event['original_line']
-                    })
-                    i += 1
+            # 按时间排序 (epoch 保留了日志中的年份)
+            events.sort(key=itemgetter('epoch'))
+            paired_sessions.extend(self.pair_client_events(client, events))
         
         return paired_sessions
     
+    def pair_client_events(self, client, events):
+        """按时间顺序流式配对单个客户端的assoc和disassoc事件"""
+        # 尚未遇到disassoc的连续assoc事件
+        pending_assocs = []
+        
+        for current_event in events:
+            if current_event['event'] == 'assoc':
+                pending_assocs.append(current_event)
+            elif pending_assocs:
+                # 连续assoc中的第一个与随后的disassoc配对，其余assoc被忽略
+                yield make_session(client, pending_assocs[0], current_event)
+                pending_assocs = []
+            else:
+                # 如果是单独的disassoc（没有对应的assoc），也记录
+                yield make_session(client, None, current_event)
+        
+        # 没有找到配对的disassoc，可能是未完成的连接
+        for assoc_event in pending_assocs:
+            yield make_session(client, assoc_event, None)
+    
+    def iter_client_sessions(self):
+        """按客户端MAC排序分组、组内按时间顺序产出会话（不做 sort_sessions 排序，单独的disassoc保持原位）"""
+        if self.event_sorter is not None:
+            for client, events in groupby(self.event_sorter.iter_sorted(), key=itemgetter('client')):
+                yield from self.pair_client_events(client, events)
+            return
+        for client in sorted(self.client_sessions):
+            events = self.client_sessions[client]
+            events.sort(key=itemgetter('epoch'))
+            yield from self.pair_client_events(client, events)
+    
+    def iter_sorted_sessions(self):
+        """外部排序模式：在k路归并后的事件流上逐客户端配对，按 sort_sessions 的顺序产出会话"""
+        for client, events in groupby(self.event_sorter.iter_sorted(), key=itemgetter('client')):
+            yield from self.sort_sessions(self.pair_client_events(client, events))
+    
     def sort_sessions(self, sessions):
         """排序：优先按客户端，然后按时间"""
         return sorted(sessions, key=lambda x: (
             x['client'],
-            datetime.strptime(x['assoc_time'], '%a %b %d %H:%M:%S') if x['assoc_time'] else datetime.min
+            x['assoc_epoch'] if x['assoc_epoch'] is not None else float('-inf')
         ))
     
     def write_output(self, sessions, output_file):
         """写入输出文件"""
         with open(output_file, 'w', encoding='ascii', errors='ignore') as f:
-            # 写入表头
-            f.write("=" * 120 + "\n")
-            f.write("WiFi Client Session Analysis Report\n")
-            f.write("=" * 120 + "\n")
-            f.write(f"Total Sessions: {len(sessions)}\n")
-            f.write(f"Unique Clients: {len(set(s['client'] for s in sessions))}\n")
-            f.write("=" * 120 + "\n\n")
-            
-            current_client = ""
-            for session in sessions:
-                # 如果是新的客户端，添加分隔符
-                if session['client'] != current_client:
-                    if current_client:
-                        f.write("\n" + "-" * 100 + "\n\n")
-                    current_client = session['client']
-                    f.write(f"CLIENT: {current_client}\n")
-                    f.write("-" * 100 + "\n")
-                
-                # 写入会话信息
-                if session['assoc_time'] and session['disassoc_time']:
-                    # 完整的连接-断开会话
-                    duration = self.calculate_duration(session['assoc_time'], session['disassoc_time'])
-                    f.write(f"ASSOC:    {session['assoc_time']} on {session['assoc_vap']}\n")
-                    f.write(f"DISASSOC: {session['disassoc_time']} on {session['disassoc_vap']} (reason: {session['reason_code']})\n")
-                    f.write(f"DURATION: {duration}\n")
-                elif session['assoc_time']:
-                    # 只有连接，没有断开
-                    f.write(f"ASSOC:    {session['assoc_time']} on {session['assoc_vap']} (No disconnection recorded)\n")
-                else:
-                    # 只有断开，没有连接
-                    f.write(f"DISASSOC: {session['disassoc_time']} on {session['disassoc_vap']} (reason: {session['reason_code']}) (No prior association recorded)\n")
-                
-                f.write("\n")
-            
-            # 写入系统reason行
-            if self.reason_lines:
-                f.write("\n" + "=" * 120 + "\n")
-                f.write("System Parameter Changes\n")
-                f.write("=" * 120 + "\n")
-                for reason in self.reason_lines:
-                    f.write(f"{reason['timestamp']}: {reason['original_line']}\n")
-            
-            # 写入skip行
-            if self.skip_lines:
-                f.write("\n" + "=" * 120 + "\n")
-                f.write("Skip Events\n")
-                f.write("=" * 120 + "\n")
-                for skip in self.skip_lines:
-                    f.write(f"{skip['timestamp']}: {skip['original_line']}\n")
+            self.write_header(f, len(sessions), len(set(s['client'] for s in sessions)))
+            self.write_sessions(f, sessions)
+            self.write_system_events(f)
+    
+    def write_output_stream(self, sessions, output_file):
+        """流式写入输出文件，sessions 须已按客户端排序；返回 (会话数, 客户端数)
+        
+        表头中的统计数字要在写完所有会话后才能确定，因此会话部分先写入临时文件。
+        """
+        with tempfile.TemporaryFile('w+', encoding='ascii', errors='ignore', dir=self.temp_dir) as body:
+            total_sessions, unique_clients = self.write_sessions(body, sessions)
+            body.seek(0)
+            with open(output_file, 'w', encoding='ascii', errors='ignore') as f:
+                self.write_header(f, total_sessions, unique_clients)
+                shutil.copyfileobj(body, f)
+                self.write_system_events(f)
+        return total_sessions, unique_clients
+    
+    def write_header(self, f, total_sessions, unique_clients):
+        """写入表头"""
+        f.write("=" * 120 + "\n")
+        f.write("WiFi Client Session Analysis Report\n")
+        f.write("=" * 120 + "\n")
+        f.write(f"Total Sessions: {total_sessions}\n")
+        f.write(f"Unique Clients: {unique_clients}\n")
+        f.write("=" * 120 + "\n\n")
+    
+    def write_sessions(self, f, sessions):
+        """写入会话部分，返回 (会话数, 客户端分组数)"""
+        total_sessions = 0
+        client_groups = 0
+        current_client = ""
+        for session in sessions:
+            total_sessions += 1
+            # 如果是新的客户端，添加分隔符
+            if session['client'] != current_client:
+                if current_client:
+                    f.write("\n" + "-" * 100 + "\n\n")
+                current_client = session['client']
+                client_groups += 1
+                f.write(f"CLIENT: {current_client}\n")
+                f.write("-" * 100 + "\n")
             
-            # 写入其他类型的行
-            if self.other_lines:
-                f.write("\n" + "=" * 120 + "\n")
-                f.write("Other Events\n")
-                f.write("=" * 120 + "\n")
-                for other in self.other_lines:
-                    f.write(f"{other['timestamp']}: {other['original_line']}\n")
-    
-    def calculate_duration(self, start_time, end_time):
-        """计算连接持续时间"""
-        try:
-            start = datetime.strptime(start_time, '%a %b %d %H:%M:%S')
-            end = datetime.strptime(end_time, '%a %b %d %H:%M:%S')
-            duration = end - start
+            # 写入会话信息
+            if session['assoc_time'] and session['disassoc_time']:
+                # 完整的连接-断开会话
+                duration = self.calculate_duration(session['assoc_epoch'], session['disassoc_epoch'])
+                f.write(f"ASSOC:    {session['assoc_time']} on {session['assoc_vap']}\n")
+                f.write(f"DISASSOC: {session['disassoc_time']} on {session['disassoc_vap']} (reason: {session['reason_code']})\n")
+                f.write(f"DURATION: {duration}\n")
+            elif session['assoc_time']:
+                # 只有连接，没有断开
+                f.write(f"ASSOC:    {session['assoc_time']} on {session['assoc_vap']} (No disconnection recorded)\n")
+            else:
+                # 只有断开，没有连接
+                f.write(f"DISASSOC: {session['disassoc_time']} on {session['disassoc_vap']} (reason: {session['reason_code']}) (No prior association recorded)\n")
             
-            total_seconds = int(duration.total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            seconds = total_seconds % 60
+            f.write("\n")
+        return total_sessions, client_groups
+    
+    def write_system_events(self, f):
+        """写入系统reason行、skip行和其他类型的行"""
+        sections = [
+            ('system_reason', "System Parameter Changes", self.reason_lines),
+            ('skip', "Skip Events", self.skip_lines),
+            ('other', "Other Events", self.other_lines)
+        ]
+        for event_type, title, lines in sections:
+            if self.system_spools is not None:
+                if not self.system_counts[event_type]:
+                    continue
+            elif not lines:
+                continue
             
-            if hours > 0:
-                return f"{hours}h {minutes}m {seconds}s"
-            elif minutes > 0:
-                return f"{minutes}m {seconds}s"
+            f.write("\n" + "=" * 120 + "\n")
+            f.write(f"{title}\n")
+            f.write("=" * 120 + "\n")
+            if self.system_spools is not None:
+                spool = self.system_spools[event_type]
+                spool.seek(0)
+                shutil.copyfileobj(spool, f)
             else:
-                return f"{seconds}s"
-        except:
-            return "Unknown"
+                for line in lines:
+                    f.write(f"{line['timestamp']}: {line['original_line']}\n")
+    
+    def close(self):
+        """释放外部排序使用的临时文件"""
+        if self.event_sorter is not None:
+            self.event_sorter.close()
+        if self.system_spools is not None:
+            for spool in self.system_spools.values():
+                spool.close()
+    
+    def calculate_duration(self, start_epoch, end_epoch):
+        """计算连接持续时间(参数为事件的 epoch 秒)"""
+        total_seconds = end_epoch - start_epoch
+        hours = total_seconds // 3600
+        minutes = (total_seconds % 3600) // 60
+        seconds = total_seconds % 60
+        
+        if hours > 0:
+            return f"{hours}h {minutes}m {seconds}s"
+        elif minutes > 0:
+            return f"{minutes}m {seconds}s"
+        else:
+            return f"{seconds}s"
+
+class Session(NamedTuple):
+    """一个客户端会话；未配对的一端为空字符串(epoch 为None)"""
+    client: str
+    assoc_time: str
+    assoc_epoch: Optional[int]
+    assoc_vap: str
+    disassoc_time: str
+    disassoc_epoch: Optional[int]
+    disassoc_vap: str
+    reason_code: str
+    assoc_line: str
+    disassoc_line: str
+    
+    @property
+    def is_complete(self):
+        return bool(self.assoc_time and self.disassoc_time)
+
+class StreamCounters(NamedTuple):
+    """WiFiSessionStream 的累计计数"""
+    lines: int
+    client_events: int
+    closed_sessions: int
+    open_sessions: int
+    system_reason: int
+    skip: int
+    other: int
+    duplicates: int
+
+class WiFiSessionStream:
+    """可嵌入的增量处理接口：直接在内存中喂入日志行，返回已关闭的会话
+    
+    配对规则与 WiFiLogProcessor.pair_sessions 一致，要求同一客户端的事件按时间顺序到达。
+    每个实例内部加锁，可以在多个线程中共享同一个实例。
+    
+        stream = WiFiSessionStream()
+        sessions = stream.feed(batch_of_lines)      # str 或 bytes 行
+        sessions += stream.feed_bytes(raw_buffer)   # 任意切分的字节块
+        counters = stream.counters()
+    """
+    
+    def __init__(self, include_system_events=True, encoding='utf-8', dedup_window=None, dialect='auto'):
+        self.processor = WiFiLogProcessor(include_system_events=include_system_events, dedup_window=dedup_window,
+                                          dialect=dialect)
+        self.encoding = encoding
+        self.lock = threading.Lock()
+        self.pending_assocs = {}   # client -> 尚未遇到disassoc的连续assoc事件
+        self.partial_line = b''    # feed_bytes 中尚未结束的半行
+        self.counts = {
+            'lines': 0,
+            'client_events': 0,
+            'closed_sessions': 0,
+            'system_reason': 0,
+            'skip': 0,
+            'other': 0
+        }
+    
+    def feed(self, lines):
+        """喂入一批 str/bytes 行，返回本批关闭的会话列表"""
+        with self.lock:
+            closed = []
+            for line in lines:
+                self._feed_line(line, closed)
+            return closed
+    
+    def feed_bytes(self, buffer, with_opened=False):
+        """喂入一个字节块（可以在任意位置切分），返回本批关闭的会话列表
+        
+        with_opened 为 True 时返回 (关闭的会话列表, 新打开的会话列表)。新打开的会话是本批中
+        新出现、到本批结束时仍未断开的连接(只有assoc)，调用方先按关闭的会话、再按新打开的会话
+        更新索引，即可增量维护未断开连接的索引。
+        """
+        with self.lock:
+            data = self.partial_line + bytes(buffer)
+            lines = data.split(b'\n')
+            self.partial_line = lines.pop()
+            closed = []
+            opened = {} if with_opened else None
+            for line in lines:
+                self._feed_line(line, closed, opened)
+            if with_opened:
+                return closed, list(opened.values())
+            return closed
+    
+    def flush(self):
+        """结束输入：处理残留的半行，并把所有未断开的连接作为会话返回"""
+        with self.lock:
+            closed = []
+            if self.partial_line:
+                self._feed_line(self.partial_line, closed)
+                self.partial_line = b''
+            for client, assoc_events in self.pending_assocs.items():
+                for assoc_event in assoc_events:
+                    closed.append(Session(**make_session(client, assoc_event, None)))
+            self.pending_assocs = {}
+            return closed
+    
+    def open_sessions(self):
+        """当前尚未断开的连接（每个客户端最早的一次未配对assoc）"""
+        with self.lock:
+            return [Session(**make_session(client, assoc_events[0], None))
+                    for client, assoc_events in self.pending_assocs.items()]
+    
+    def counters(self):
+        """累计计数快照"""
+        with self.lock:
+            return StreamCounters(open_sessions=len(self.pending_assocs),
+                                  duplicates=self.processor.duplicate_count(), **self.counts)
+    
+    def __getstate__(self):
+        # 锁不能序列化，快照中只保存配对状态和计数
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+    
+    def _feed_line(self, line, closed, opened=None):
+        if isinstance(line, (bytes, bytearray, memoryview)):
+            line = bytes(line).decode(self.encoding, errors='ignore')
+        self.counts['lines'] += 1
+        
+        parsed = self.processor.parse_line(line)
+        if not parsed:
+            return
+        if parsed['type'] != 'client_event':
+            self.counts[parsed['type']] += 1
+            return
+        if self.processor.dedup_filter is not None and self.processor.dedup_filter.is_duplicate_event(parsed):
+            return
+        
+        self.counts['client_events'] += 1
+        client = parsed['client']
+        if parsed['event'] == 'assoc':
+            assoc_events = self.pending_assocs.setdefault(client, [])
+            assoc_events.append(parsed)
+            if opened is not None and len(assoc_events) == 1:
+                opened[client] = Session(**make_session(client, parsed, None))
+            return
+        
+        # 连续assoc中的第一个与disassoc配对；没有assoc时记录为单独的disassoc
+        assoc_events = self.pending_assocs.pop(client, None)
+        if opened is not None:
+            opened.pop(client, None)
+        closed.append(Session(**make_session(client, assoc_events[0] if assoc_events else None, parsed)))
+        self.counts['closed_sessions'] += 1
 
 def main():
     parser = argparse.ArgumentParser(description='WiFi日志数据处理工具')
     parser.add_argument('input_file', help='输入日志文件路径')
     parser.add_argument('-o', '--output', default='processed_wifi_log.txt', help='输出文件路径（默认：processed_wifi_log.txt）')
     parser.add_argument('--no-system-events', action='store_true', help='不包含系统事件（reason、skip等行）')
+    parser.add_argument('--max-memory', type=int, default=None, help='内存预算(MB)，超出后排好序的事件批次溢写到临时文件（默认：不限制）')
+    parser.add_argument('--temp-dir', default=None, help='溢写临时文件目录（默认：系统临时目录）')
+    parser.add_argument('--dedup-window', type=int, default=None, help='配对前丢弃该秒数窗口内的重复客户端事件（默认：不去重）')
+    parser.add_argument('--dialect', default='auto', choices=['auto'] + list(DIALECTS), help='日志方言（默认：auto，按文件开头检测）')
     
     args = parser.parse_args()
     
-    processor = WiFiLogProcessor(include_system_events=not args.no_system_events)
-    
-    print("正在处理日志文件...")
-    processor.process_file(args.input_file)
-    
-    print("正在配对连接会话...")
-    sessions = processor.pair_sessions()
+    max_memory = args.max_memory * 1024 * 1024 if args.max_memory else None
+    processor = WiFiLogProcessor(include_system_events=not args.no_system_events,
+                                 max_memory=max_memory, temp_dir=args.temp_dir, dedup_window=args.dedup_window,
+                                 dialect=args.dialect)
     
-    print("正在排序...")
-    sorted_sessions = processor.sort_sessions(sessions)
-    
-    print(f"正在写入输出文件: {args.output}")
-    processor.write_output(sorted_sessions, args.output)
+    try:
+        print("正在处理日志文件...")
+        processor.process_file(args.input_file)
+        
+        if processor.event_sorter is not None:
+            print(f"正在归并配对连接会话 (溢写 {len(processor.event_sorter.run_files)} 个有序批次)...")
+            print(f"正在写入输出文件: {args.output}")
+            total_sessions, unique_clients = processor.write_output_stream(processor.iter_sorted_sessions(), args.output)
+        else:
+            print("正在配对连接会话...")
+            sessions = processor.pair_sessions()
+            
+            print("正在排序...")
+            sorted_sessions = processor.sort_sessions(sessions)
+            
+            print(f"正在写入输出文件: {args.output}")
+            processor.write_output(sorted_sessions, args.output)
+            total_sessions = len(sorted_sessions)
+            unique_clients = len(set(s['client'] for s in sorted_sessions))
+    finally:
+        processor.close()
     
+    reason_count, skip_count, other_count = processor.system_event_counts()
     print(f"处理完成！")
-    print(f"总共处理了 {len(sorted_sessions)} 个会话")
-    print(f"涉及 {len(set(s['client'] for s in sorted_sessions))} 个客户端")
-    print(f"系统参数变更: {len(processor.reason_lines)} 条")
-    print(f"Skip事件: {len(processor.skip_lines)} 条")
-    print(f"其他事件: {len(processor.other_lines)} 条")
+    print(f"总共处理了 {total_sessions} 个会话")
+    print(f"涉及 {unique_clients} 个客户端")
+    if processor.dedup_filter is not None:
+        print(f"重复事件: {processor.duplicate_count()} 条已丢弃")
+    print(f"系统参数变更: {reason_count} 条")
+    print(f"Skip事件: {skip_count} 条")
+    print(f"其他事件: {other_count} 条")
     print(f"结果已保存到: {args.output}")
 
 if __name__ == "__main__":
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WiFi日志公共模块：方言定义、时间戳换算和重复事件过滤
+==========================================
+
+不同固件版本的日志前缀、时间戳格式、字段名和事件标记各不相同。这里用声明式的
+LogDialect 描述每种格式，加载时编译为带首词分派表的 DialectMatcher：
+- 每个方言编译成一个锚定的正则，一次匹配整行，取出时间戳、客户端事件或配置变更的全部字段
+- 整行不完全符合模板的行(字段缺少分隔符、插入了其他字段等)改用宽松正则：
+  消息中的每个模板段按逗号拆片后在消息内任意位置查找；字段值本身仍须符合其类型
+- 按行首第一个词(如 USSA、USSA2、wifid:)直接选择方言，不逐个尝试
+- 首词未知的行退回到检测出的(或默认的)方言，在整行中搜索时间戳
+- 同一份定义也用于生成日志(generate_data.py)，保证解析和生成的格式一致
+
+消息模板是 (必需段, 可选段...) 元组，占位符为规范字段名，必需段确定事件类型：
+    client, event, vap, reason_code, rssi, channel
+    config_reason, old_channel, new_channel, old_bandwidth, new_bandwidth, old_tx_power, new_tx_power
+模板中的空白在解析时匹配任意长度的空白；格式说明(如 {old_tx_power:.6f})只用于生成。
+
+本模块只依赖标准库，data_processor.py、wifi_daemon.py 和 src/ 下的分析脚本共用。
+
+使用方法:
+    python log_common.py ussawifievent_optimized.txt    # 检测方言并测量解析速度
+"""
+
+import argparse
+import hashlib
+import re
+import string
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import NamedTuple
+
+# data_processor 输出中使用的规范时间戳格式
+CANONICAL_TIMESTAMP_FORMAT = '%a %b %d %H:%M:%S'
+CLOCK_FORMAT = '%H:%M:%S'
+
+# 事件 epoch (自 EPOCH_BASE 起的整数秒) 用于排序、溢写、去重和间隔计算；格式中没有年份时按1900年
+EPOCH_BASE = datetime(1900, 1, 1)
+
+# CompiledDialect.config_fields 返回的系统参数变化字段
+CONFIG_FIELDS = ('config_reason', 'old_channel', 'new_channel', 'old_bandwidth', 'new_bandwidth',
+                 'old_tx_power', 'new_tx_power')
+
+
+class DuplicateEventFilter:
+    """时间窗口内的重复事件过滤：AP重传或日志转发重复写入的同一事件只保留第一条
+
+    以规范化后的 (时间戳, 客户端, 事件, VAP, 原因码) 元组的64位摘要为键，
+    只保留最近 window_seconds 秒内见过的键，内存占用与窗口内的事件数成正比，与日志总长度无关。
+    """
+
+    def __init__(self, window_seconds=60):
+        self.window_seconds = window_seconds
+        self.seen = {}          # 摘要 -> epoch
+        self.expiry = deque()   # (epoch, 摘要)，按进入顺序过期
+        self.watermark = None   # 见过的最大 epoch
+        self.dropped = 0
+
+    @staticmethod
+    def event_key(timestamp, client, event, vap, reason_code):
+        """规范化事件字段并计算64位摘要"""
+        normalized = '\x1f'.join((
+            ' '.join(str(timestamp).split()),
+            str(client).strip().lower(),
+            str(event).strip().lower(),
+            str(vap).strip(),
+            '' if reason_code is None else str(reason_code).strip()
+        ))
+        return int.from_bytes(hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    def is_duplicate(self, epoch, timestamp, client, event, vap, reason_code):
+        """窗口内已见过相同事件时返回True并计数；否则记录该事件并返回False"""
+        if self.watermark is None or epoch > self.watermark:
+            self.watermark = epoch
+            horizon = epoch - self.window_seconds
+            while self.expiry and self.expiry[0][0] < horizon:
+                expired_epoch, expired_key = self.expiry.popleft()
+                if self.seen.get(expired_key) == expired_epoch:
+                    del self.seen[expired_key]
+
+        key = self.event_key(timestamp, client, event, vap, reason_code)
+        if key in self.seen:
+            self.dropped += 1
+            return True
+        if epoch >= self.watermark - self.window_seconds:
+            # 早于窗口的乱序事件无法可靠判重，直接放行且不记录
+            self.seen[key] = epoch
+            self.expiry.append((epoch, key))
+        return False
+
+    def is_duplicate_event(self, parsed):
+        """判断 WiFiLogProcessor.parse_line 解析出的客户端事件是否为重复事件"""
+        return self.is_duplicate(parsed['epoch'], parsed['timestamp'], parsed['client'],
+                                 parsed['event'], parsed['vap'], parsed['reason_code'])
+
+    def is_duplicate_config(self, epoch, timestamp, config):
+        """判断系统参数变化是否为重复事件，以时间戳和全部配置字段为键"""
+        fields = ','.join(f"{name}={config.get(name)}" for name in CONFIG_FIELDS)
+        return self.is_duplicate(epoch, timestamp, '', 'config_change', fields, config['config_reason'])
+
+    def __len__(self):
+        return len(self.seen)
+
+
+TIMESTAMP_DIRECTIVES = {
+    'a': r'\w{3}', 'b': r'\w{3}', 'd': r'\d+', 'm': r'\d+', 'Y': r'\d{4}',
+    'H': r'\d+', 'M': r'\d+', 'S': r'\d+', 'f': r'\d+', '%': '%'
+}
+
+# 名称类字段在 key=value 格式中到空白或逗号为止；模板中紧跟 ']' 时取到 ']' 为止
+TOKEN_PATTERN = r'[^\]\s,]+'
+BRACKETED_PATTERN = r'[^\]]+'
+
+FIELD_PATTERNS = {
+    'level': r'\w+',
+    'client': TOKEN_PATTERN,
+    'vap': TOKEN_PATTERN,
+    'reason_code': r'\d+',
+    'rssi': r'-?\d+',
+    'channel': r'\d+',
+    'config_reason': r'\d+',
+    'old_channel': r'\d+',
+    'new_channel': r'\d+',
+    'old_bandwidth': r'[\w.]*',
+    'new_bandwidth': r'[\w.]*',
+    'old_tx_power': r'[\d.]+',
+    'new_tx_power': r'[\d.]+'
+}
+
+
+class LogDialect(NamedTuple):
+    """声明式日志方言定义"""
+    name: str
+    line_template: str        # 整行格式，占位符 {timestamp} {level} {message}；第一个词为分派前缀
+    timestamp_format: str     # strptime/strftime 格式
+    client_event: tuple       # 客户端事件消息模板 (必需段, 可选段...)
+    config_change: tuple      # 系统参数变化消息模板 (必需段, 可选段...)
+    event_markers: dict       # 规范事件名(assoc/disassoc) -> 日志中的事件标记
+
+
+USSA_CONFIG_CHANGE = (
+    'reason=[{config_reason}], oldCh->newCh=[{old_channel}]->[{new_channel}]',
+    ', oldBw->newBw=[{old_bandwidth}]->[{new_bandwidth}]',
+    ', oldTxPower->newTxPower=[{old_tx_power:.6f}]->[{new_tx_power:.6f}]'
+)
+
+DIALECTS = {}
+
+
+def register_dialect(dialect):
+    """注册方言，之后创建的 DialectMatcher 会包含它"""
+    DIALECTS[dialect.name] = dialect
+    return dialect
+
+
+# 当前固件: USSA > Fri Jul 07 08:00:00 | NOTICE  | reported client=[..] disassoc on vap=[rai4], reason code=[15]
+register_dialect(LogDialect(
+    name='ussa',
+    line_template='USSA > {timestamp} | {level}  | {message}',
+    timestamp_format='%a %b %d %H:%M:%S',
+    client_event=('reported client=[{client}] {event}', ' on vap=[{vap}]', ', reason code=[{reason_code}]'),
+    config_change=USSA_CONFIG_CHANGE,
+    event_markers={'assoc': 'assoc', 'disassoc': 'disassoc'}
+))
+
+# 新固件: ISO时间戳，客户端事件附带 rssi/channel 字段
+register_dialect(LogDialect(
+    name='ussa_iso',
+    line_template='USSA2 > {timestamp} | {level} | {message}',
+    timestamp_format='%Y-%m-%dT%H:%M:%S',
+    client_event=('reported client=[{client}] {event}', ' on vap=[{vap}]', ', reason code=[{reason_code}]',
+                  ', rssi=[{rssi}]', ', channel=[{channel}]'),
+    config_change=USSA_CONFIG_CHANGE,
+    event_markers={'assoc': 'assoc', 'disassoc': 'disassoc'}
+))
+
+# key=value 格式: wifid: 2023-07-07 08:00:00.000000 [NOTICE] STA_DISCONNECTED sta=.. ifname=rai4 reason=15
+register_dialect(LogDialect(
+    name='wifid',
+    line_template='wifid: {timestamp} [{level}] {message}',
+    timestamp_format='%Y-%m-%d %H:%M:%S.%f',
+    client_event=('{event} sta={client}', ' ifname={vap}', ' reason={reason_code}', ' rssi={rssi}'),
+    config_change=('CHANNEL_SWITCH cause={config_reason} channel={old_channel}->{new_channel}',
+                   ' bw={old_bandwidth}->{new_bandwidth}', ' txpower={old_tx_power:.2f}->{new_tx_power:.2f}'),
+    event_markers={'assoc': 'STA_CONNECTED', 'disassoc': 'STA_DISCONNECTED'}
+))
+
+DEFAULT_DIALECT = 'ussa'
+
+
+def literal_regex(text):
+    """模板中的字面文本：转义后把空白替换为任意长度空白"""
+    return r'\s+'.join(re.escape(chunk) for chunk in re.split(r'\s+', text))
+
+
+def timestamp_regex(timestamp_format):
+    """由 strptime 格式生成时间戳正则
+
+    格式中含 %H:%M:%S 时，其前面的日期部分和时分秒分别再包一个分组(ts_day, ts_clock)，
+    换算为规范格式时只需按日期查缓存再拼接时分秒文本。
+    """
+    if CLOCK_FORMAT in timestamp_format:
+        day, rest = timestamp_format.split(CLOCK_FORMAT, 1)
+        return (f'(?P<ts_day>{directives_regex(day)})(?P<ts_clock>{directives_regex(CLOCK_FORMAT)})'
+                + directives_regex(rest))
+    return directives_regex(timestamp_format)
+
+
+def directives_regex(timestamp_format):
+    parts = []
+    for i, chunk in enumerate(timestamp_format.split('%')):
+        if i == 0:
+            parts.append(literal_regex(chunk))
+            continue
+        directive = chunk[:1]
+        pattern = TIMESTAMP_DIRECTIVES[directive]
+        if directive != '%':
+            # 每个时间字段一个命名分组，时间戳换算时直接读取，无需再次 strptime
+            pattern = f'(?P<ts_{directive}>{pattern})'
+        parts.append(pattern + literal_regex(chunk[1:]))
+    return ''.join(parts)
+
+
+def template_fields(template):
+    return [name for _, name, _, _ in string.Formatter().parse(template) if name]
+
+
+def template_regex(template, patterns):
+    """把消息模板编译为带命名分组的正则片段"""
+    parsed = list(string.Formatter().parse(template))
+    parts = []
+    for i, (literal, name, _, _) in enumerate(parsed):
+        parts.append(literal_regex(literal))
+        if name:
+            pattern = patterns[name]
+            following = parsed[i + 1][0] if i + 1 < len(parsed) else ''
+            if pattern == TOKEN_PATTERN and following.startswith(']'):
+                pattern = BRACKETED_PATTERN
+            parts.append(f'(?P<{name}>{pattern})')
+    return ''.join(parts)
+
+
+def segments_regex(segments, patterns):
+    """(必需段, 可选段...) -> 正则片段"""
+    required, *optional = segments
+    return template_regex(required, patterns) + ''.join(
+        f'(?:{template_regex(segment, patterns)})?' for segment in optional)
+
+
+def loose_segments_regex(segments, patterns):
+    """(必需段, 可选段...) -> 宽松正则片段：在剩余消息中任意位置查找的前瞻
+
+    每段按逗号分隔符拆成若干片，每片是一个前瞻，片与片之间允许出现其他文本；
+    必需段的各片都要找到，可选段的各片要么都找到，要么整段缺失。
+    """
+    def lookaheads(segment):
+        pieces = [piece.strip() for piece in segment.split(',')]
+        return ''.join(f'(?=.*?{template_regex(piece, patterns)})' for piece in pieces if piece)
+
+    required, *optional = segments
+    return lookaheads(required) + ''.join(f'(?:{lookaheads(segment)})?' for segment in optional)
+
+
+class CompiledDialect:
+    """编译后的方言：解析用的正则和生成用的模板"""
+
+    def __init__(self, dialect):
+        self.dialect = dialect
+        self.name = dialect.name
+        self.prefix = dialect.line_template.split()[0]
+        self.timestamp_format = dialect.timestamp_format
+        self.has_year = '%Y' in dialect.timestamp_format
+        self.is_canonical = dialect.timestamp_format == CANONICAL_TIMESTAMP_FORMAT
+
+        # 日期部分按 (年份, 日期字段) 缓存，时分秒直接由分组拼接
+        directives = re.findall(r'%(.)', dialect.timestamp_format)
+        self.date_groups = tuple(f'ts_{d}' for d in directives if d in 'aYmbd')
+        self.date_format = ' '.join(f'%{d}' for d in directives if d in 'aYmbd')
+        self.time_groups = self.date_groups + ('ts_H', 'ts_M', 'ts_S')
+        self.has_fraction = 'f' in directives
+        self.fast_time = all(d in directives for d in 'HMS') and len(self.date_groups) > 1
+        # 日期字段全部位于 %H:%M:%S 之前时，可以按 ts_day 文本缓存日期
+        day_format = dialect.timestamp_format.split(CLOCK_FORMAT, 1)[0]
+        self.fast_clock = (self.fast_time and CLOCK_FORMAT in dialect.timestamp_format
+                           and all(f'%{d}' in day_format for d in directives if d in 'aYmbd'))
+        self.date_cache = {}       # (年份, 日期字段...) -> date
+        self.day_cache = {}        # ts_day 文本 -> ('Fri Jul 07', 当天0点的 epoch)
+        self.minute_cache = {}     # 'HH:MM' -> 当天的秒数 (最多1440项)
+        self.event_names = {marker: event for event, marker in dialect.event_markers.items()}
+        self.client_fields = {name for segment in dialect.client_event for name in template_fields(segment)}
+
+        # 事件标记按长度降序，避免短标记抢先匹配
+        markers = sorted(self.event_names, key=len, reverse=True)
+        patterns = dict(FIELD_PATTERNS,
+                        timestamp=timestamp_regex(dialect.timestamp_format),
+                        event='|'.join(re.escape(marker) for marker in markers))
+        strict_message = (f'(?:{segments_regex(dialect.client_event, patterns)}'
+                          f'|{segments_regex(dialect.config_change, patterns)})?')
+        loose_message = (f'(?:{loose_segments_regex(dialect.client_event, patterns)})?'
+                         f'(?:{loose_segments_regex(dialect.config_change, patterns)})?.*')
+
+        head, tail = dialect.line_template.split('{timestamp}', 1)
+        head = r'\s*' + literal_regex(head.strip()) + r'\s+'
+        timestamp = template_regex('{timestamp}', patterns)
+        # 严格正则须匹配整行；整行不符合模板时用宽松正则，各模板段在消息中任意位置查找
+        self.pattern = re.compile(head + timestamp + template_regex(tail, dict(patterns, message=strict_message))
+                                  + r'\s*')
+        self.loose_pattern = re.compile(head + timestamp
+                                        + template_regex(tail, dict(patterns, message=loose_message)))
+        # 首词不匹配时的退路：在整行中搜索时间戳，时间戳之后按宽松正则查找各模板段
+        self.search_pattern = re.compile(timestamp + loose_message)
+
+        # 时间字段按分组序号读取(比按名称读取快一倍)；
+        # 三个正则中时间戳分组都位于其他分组之前，序号相同
+        if self.fast_time:
+            self.time_index = tuple(self.pattern.groupindex[name] for name in self.time_groups)
+        if self.fast_clock:
+            self.clock_index = (self.pattern.groupindex['ts_day'], self.pattern.groupindex['ts_clock'])
+
+    def parse_date(self, values, default_year=1900):
+        """日期字段 -> date，按 (年份, 日期字段) 缓存"""
+        key = values if self.has_year else (default_year,) + values
+        date = self.date_cache.get(key)
+        if date is None:
+            if self.has_year:
+                date = datetime.strptime(' '.join(values), self.date_format).date()
+            else:
+                date = datetime.strptime(f"{default_year} {' '.join(values)}", f"%Y {self.date_format}").date()
+            self.date_cache[key] = date
+        return date
+
+    def parse_timestamp(self, match, default_year=1900):
+        """匹配结果中的时间戳 -> datetime；格式中没有年份时使用 default_year"""
+        if not self.fast_time:
+            text = match.group('timestamp')
+            if self.has_year:
+                return datetime.strptime(text, self.timestamp_format)
+            return datetime.strptime(f"{default_year} {text}", f"%Y {self.timestamp_format}")
+
+        values = match.group(*self.time_index)
+        date = self.parse_date(values[:-3], default_year)
+        hour, minute, second = values[-3:]
+        fraction = match.group('ts_f') if self.has_fraction else None
+        return datetime(date.year, date.month, date.day, int(hour), int(minute), int(second),
+                        int(fraction[:6].ljust(6, '0')) if fraction else 0)
+
+    def event_time(self, match):
+        """匹配结果中的时间戳 -> (规范格式文本, epoch)
+
+        规范格式(不含年份)只用于报告显示；epoch 为自 EPOCH_BASE 起的整数秒，保留格式中的年份，
+        用于排序、溢写、去重和间隔计算。
+        """
+        if self.fast_clock:
+            day_text, clock = match.group(*self.clock_index)
+            day = self.day_cache.get(day_text)
+            if day is None:
+                day = self.day_cache[day_text] = self.day_info(match)
+            if len(clock) == 8:
+                minute = self.minute_cache.get(clock[:5])
+                if minute is None:
+                    minute = self.minute_cache[clock[:5]] = int(clock[:2]) * 3600 + int(clock[3:5]) * 60
+                text = match.group('timestamp') if self.is_canonical else f"{day[0]} {clock}"
+                return text, day[1] + minute + int(clock[6:])
+
+        if not self.fast_time:
+            timestamp = self.parse_timestamp(match)
+            text = match.group('timestamp') if self.is_canonical else timestamp.strftime(CANONICAL_TIMESTAMP_FORMAT)
+            return text, int((timestamp - EPOCH_BASE).total_seconds())
+
+        day_name, day_epoch = self.day_info(match)
+        hour, minute, second = match.group('ts_H', 'ts_M', 'ts_S')
+        text = (match.group('timestamp') if self.is_canonical
+                else f"{day_name} {hour:0>2}:{minute:0>2}:{second:0>2}")
+        return text, day_epoch + int(hour) * 3600 + int(minute) * 60 + int(second)
+
+    def day_info(self, match):
+        """匹配结果中的日期 -> (规范日期 'Fri Jul 07', 当天0点的 epoch)"""
+        values = match.group(*self.time_index)
+        date = self.parse_date(values[:-3])
+        return date.strftime('%a %b %d'), (date - EPOCH_BASE.date()).days * 86400
+
+    def config_fields(self, match):
+        """从匹配结果中取出带类型的配置变更字段，缺失的字段为None"""
+        old_power = match.group('old_tx_power')
+        new_power = match.group('new_tx_power')
+        return {  # 键与 CONFIG_FIELDS 一致
+            'config_reason': int(match.group('config_reason')),
+            'old_channel': int(match.group('old_channel')),
+            'new_channel': int(match.group('new_channel')),
+            'old_bandwidth': match.group('old_bandwidth'),
+            'new_bandwidth': match.group('new_bandwidth'),
+            'old_tx_power': float(old_power) if old_power else None,
+            'new_tx_power': float(new_power) if new_power else None
+        }
+
+    def format_timestamp(self, timestamp):
+        return timestamp.strftime(self.timestamp_format)
+
+    def format_line(self, timestamp, message, level='NOTICE'):
+        return self.dialect.line_template.format(timestamp=timestamp, level=level, message=message)
+
+    def format_client_event(self, timestamp, client, event, vap, reason_code=None, level='NOTICE', **extra):
+        """生成客户端事件行；值为None的可选段被省略，方言不支持的额外字段被忽略"""
+        values = dict(extra, client=client, event=self.dialect.event_markers[event], vap=vap,
+                      reason_code=reason_code)
+        return self.format_line(timestamp, self.format_segments(self.dialect.client_event, values), level)
+
+    def format_config_change(self, timestamp, level='NOTICE', **values):
+        """生成系统参数变化行"""
+        return self.format_line(timestamp, self.format_segments(self.dialect.config_change, values), level)
+
+    @staticmethod
+    def format_segments(segments, values):
+        required, *optional = segments
+        message = required.format(**values)
+        for segment in optional:
+            if all(values.get(name) is not None for name in template_fields(segment)):
+                message += segment.format(**values)
+        return message
+
+
+class DialectMatcher:
+    """按行首第一个词分派到编译后的方言"""
+
+    def __init__(self, dialects=None, fallback=DEFAULT_DIALECT):
+        names = [dialects] if isinstance(dialects, str) else (dialects or list(DIALECTS))
+        self.dialects = {name: CompiledDialect(DIALECTS[name]) for name in names}
+        self.dispatch = {dialect.prefix: dialect for dialect in self.dialects.values()}
+        self.fallback = self.dialects.get(fallback) or next(iter(self.dialects.values()))
+
+    def match(self, line):
+        """返回 (方言, 匹配结果)；无法识别时返回 (None, None)
+
+        匹配结果中客户端事件的 client 分组、配置变更的 config_reason 分组不为None。
+        """
+        dialect = self.dispatch.get(line[:line.find(' ')])
+        if dialect is not None:
+            match = dialect.pattern.fullmatch(line) or dialect.loose_pattern.match(line)
+            if match:
+                return dialect, match
+        match = self.fallback.search_pattern.search(line)
+        if match:
+            return self.fallback, match
+        return None, None
+
+    def detect(self, lines):
+        """根据若干行(通常是文件开头)检测方言名称，无法识别时返回None"""
+        votes = Counter()
+        for line in lines:
+            dialect = self.dispatch.get(line[:line.find(' ')])
+            if dialect is not None and dialect.pattern.match(line):
+                votes[dialect.name] += 1
+        return votes.most_common(1)[0][0] if votes else None
+
+    def detect_file(self, log_file, head_lines=100, encoding='utf-8'):
+        """检测文件开头的方言，并把它设为首词未知时的退路方言"""
+        with open(log_file, 'r', encoding=encoding, errors='ignore') as f:
+            head = [line for _, line in zip(range(head_lines), f)]
+        name = self.detect(head)
+        if name is not None:
+            self.fallback = self.dialects[name]
+        return name
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WiFi日志方言检测与解析速度测试')
+    parser.add_argument('log_files', nargs='+', help='输入日志文件路径')
+    parser.add_argument('--repeat', type=int, default=3, help='重复解析次数，取最快的一次（默认：3）')
+
+    args = parser.parse_args()
+
+    # 测量完整的 WiFiLogProcessor.parse_line (方言匹配 + 时间戳换算 + 事件字典)
+    from data_processor import WiFiLogProcessor
+
+    for log_file in args.log_files:
+        processor = WiFiLogProcessor()
+        name = processor.matcher.detect_file(log_file)
+        with open(log_file, 'r', encoding='utf-8', errors='ignore') as f:
+            lines = f.readlines()
+
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            parsed = sum(1 for line in lines if processor.parse_line(line) is not None)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        rate = len(lines) / best if best else 0
+        print(f"{log_file}: 方言 {name or '未知'}, {parsed}/{len(lines)} 行已解析, {rate:,.0f} 行/秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -32,7 +32,10 @@ WiFi日志数据分析脚本
 - Code 23: 802.1X认证失败
 """
 
-import re
+import io
+import html
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -40,15 +43,25 @@ from datetime import datetime
 import numpy as np
 from collections import defaultdict, Counter
 
+try:
+    import project_paths  # noqa: F401  项目根目录下的共享模块
+except ImportError:
+    from src import project_paths  # noqa: F401  在项目根目录以 src.xxx 方式导入时
+from log_common import DIALECTS, DialectMatcher, DuplicateEventFilter
+
 # 设置中文字体 (如果需要显示中文)
 plt.rcParams['font.sans-serif'] = ['DejaVu Sans']
 plt.rcParams['axes.unicode_minus'] = False
 
 class OptimizedWiFiAnalyzer:
-    def __init__(self, log_file):
+    def __init__(self, log_file, dedup_window=None, dialect='auto'):
         self.log_file = log_file
         self.events = []
         
+        # 重复事件过滤窗口(秒)，None 表示不去重
+        self.dedup_window = dedup_window
+        self.duplicates_dropped = 0
+        
         # 6种主要断连原因
         self.reason_code_mapping = {
             1: "Unspecified reason",
@@ -67,71 +80,106 @@ class OptimizedWiFiAnalyzer:
             "Unspecified": [1]  # 未指定
         }
         
+        # 日志方言匹配器 (加载时编译，供批量解析和实时解析共用)
+        # 'auto' 时按行首分派所有已注册方言，并在解析文件前检测文件开头的方言
+        self.dialect = dialect
+        self.matcher = DialectMatcher(None if dialect == 'auto' else dialect)
+        
     def parse_log_file(self):
         """解析日志文件"""
         print("正在解析优化日志文件...")
         
-        # 定义正则表达式模式
-        client_pattern = r'reported client=\[([^\]]+)\] (assoc|disassoc) on vap=\[([^\]]+)\](?:, reason code=\[(\d+)\])?'
-        time_pattern = r'(\w{3} \w{3} \d+ \d+:\d+:\d+)'
-        config_pattern = r'reason=\[(\d+)\], oldCh->newCh=\[(\d+)\]->\[(\d+)\]'
-        
-        with open(self.log_file, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                try:
-                    # 提取时间戳
-                    time_match = re.search(time_pattern, line)
-                    if not time_match:
-                        continue
-                    
-                    timestamp_str = time_match.group(1)
-                    # 解析时间戳
-                    timestamp = datetime.strptime(f"2023 {timestamp_str}", "%Y %a %b %d %H:%M:%S")
-                    
-                    # 检查是否为客户端事件
-                    client_match = re.search(client_pattern, line)
-                    if client_match:
-                        client_mac = client_match.group(1)
-                        event_type = client_match.group(2)
-                        vap = client_match.group(3)
-                        reason_code = int(client_match.group(4)) if client_match.group(4) else None
-                        
-                        event = {
-                            'timestamp': timestamp,
-                            'client_mac': client_mac,
-                            'event_type': event_type,
-                            'vap': vap,
-                            'reason_code': reason_code,
-                            'line_num': line_num,
-                            'raw_line': line.strip()
-                        }
-                        
-                        self.events.append(event)
-                    
-                    # 检查是否为配置变更事件
-                    config_match = re.search(config_pattern, line)
-                    if config_match:
-                        event = {
-                            'timestamp': timestamp,
-                            'client_mac': None,
-                            'event_type': 'config_change',
-                            'vap': None,
-                            'reason_code': None,
-                            'config_reason': int(config_match.group(1)),
-                            'old_channel': int(config_match.group(2)),
-                            'new_channel': int(config_match.group(3)),
-                            'line_num': line_num,
-                            'raw_line': line.strip()
-                        }
-                        self.events.append(event)
-                        
-                except Exception as e:
-                    print(f"解析第{line_num}行时出错: {e}")
-                    continue
+        for event in self.iter_log_events():
+            self.events.append(event)
         
         print(f"成功解析 {len(self.events)} 个事件")
+        if self.dedup_window:
+            print(f"丢弃重复事件 {self.duplicates_dropped} 个")
         return self.events
     
+    def iter_log_events(self, log_file=None):
+        """逐行解析日志文件，按文件顺序逐个产出事件（不在内存中累积）
+        
+        设置了 dedup_window 时，窗口内重复的客户端事件和配置变更会被丢弃，不会重复计数。
+        """
+        log_file = log_file or self.log_file
+        if self.dialect == 'auto':
+            self.matcher.detect_file(log_file)
+        
+        with open(log_file, 'r', encoding='utf-8') as f:
+            yield from self.drop_duplicates(self.iter_line_events(f))
+    
+    def iter_line_events(self, lines):
+        """逐行解析，产出每行包含的事件；解析出错的行打印后跳过"""
+        for line_num, line in enumerate(lines, 1):
+            try:
+                events = self.parse_event_line(line, line_num)
+            except Exception as e:
+                print(f"解析第{line_num}行时出错: {e}")
+                continue
+            yield from events
+    
+    def drop_duplicates(self, events):
+        """丢弃 dedup_window 窗口内重复的事件；未设置窗口时原样产出"""
+        if not self.dedup_window:
+            yield from events
+            return
+        
+        dedup_filter = DuplicateEventFilter(self.dedup_window)
+        for event in events:
+            epoch = event['timestamp'].timestamp()
+            timestamp = event['timestamp'].isoformat()
+            if event['client_mac'] is not None:
+                duplicate = dedup_filter.is_duplicate(epoch, timestamp, event['client_mac'], event['event_type'],
+                                                      event['vap'], event['reason_code'])
+            else:
+                duplicate = dedup_filter.is_duplicate_config(epoch, timestamp, event)
+            if duplicate:
+                self.duplicates_dropped += 1
+                continue
+            yield event
+    
+    def parse_event_line(self, line, line_num=0):
+        """解析单行日志，返回该行包含的事件列表（可能为空）"""
+        events = []
+        
+        # 按方言匹配时间戳和事件字段
+        dialect, match = self.matcher.match(line)
+        if match is None:
+            return events
+        
+        # 解析时间戳 (格式中没有年份时按2023年)
+        timestamp = dialect.parse_timestamp(match, default_year=2023)
+        
+        # 检查是否为客户端事件 (需要带VAP)
+        client_mac, event_marker, vap, reason_code = match.group('client', 'event', 'vap', 'reason_code')
+        if client_mac is not None and vap is not None:
+            events.append({
+                'timestamp': timestamp,
+                'client_mac': client_mac,
+                'event_type': dialect.event_names[event_marker],
+                'vap': vap,
+                'reason_code': int(reason_code) if reason_code else None,
+                'line_num': line_num,
+                'raw_line': line.strip()
+            })
+        
+        # 检查是否为配置变更事件
+        elif match.group('config_reason') is not None:
+            event = {
+                'timestamp': timestamp,
+                'client_mac': None,
+                'event_type': 'config_change',
+                'vap': None,
+                'reason_code': None
+            }
+            event.update(dialect.config_fields(match))
+            event['line_num'] = line_num
+            event['raw_line'] = line.strip()
+            events.append(event)
+        
+        return events
+    
     def create_dataframe(self):
         """创建pandas DataFrame"""
         if not self.events:
@@ -146,10 +194,7 @@ class OptimizedWiFiAnalyzer:
         def get_category(reason_code):
             if pd.isna(reason_code):
                 return "None"
-            for category, codes in self.reason_categories.items():
-                if reason_code in codes:
-                    return category
-            return "Other"
+            return self.get_reason_category(reason_code)
         
         df['reason_category'] = df['reason_code'].apply(get_category)
         
@@ -267,28 +312,88 @@ class OptimizedWiFiAnalyzer:
         
         return hourly_patterns
     
-    def visualize_data(self, df):
-        """数据可视化"""
+    def build_plot_tables(self, df, top_n=10):
+        """把事件DataFrame预聚合为绘图用的小表
+        
+        只对事件做一次分组计数，得到 (vap, reason_code, date, hour) 计数立方体，
+        其余表格都从这个立方体派生，绘图耗时与事件数量无关。
+        """
+        # 没有 reason code 的断连行不计入原因统计
+        disassoc_df = df[(df['event_type'] == 'disassoc') & df['reason_code'].notna()]
+        client_df = df[df['event_type'].isin(['assoc', 'disassoc'])]
+        
+        cube = disassoc_df.groupby([
+            disassoc_df['vap'],
+            disassoc_df['reason_code'].astype(int),
+            disassoc_df['timestamp'].dt.date.rename('date'),
+            disassoc_df['hour']
+        ]).size()
+        
+        tables = {
+            'hour_event': client_df.groupby(['hour', 'event_type']).size().unstack(fill_value=0),
+            'reason_counts': pd.Series(dtype=int),
+            'category_counts': pd.Series(dtype=int),
+            'vap_reason': pd.DataFrame(),
+            'per_day': {},
+            'per_vap': {}
+        }
+        if cube.empty:
+            return tables
+        
+        reason_counts = cube.groupby(level='reason_code').sum().sort_index()
+        category_counts = reason_counts.groupby(
+            lambda code: self.get_reason_category(code)).sum().sort_values(ascending=False)
+        reason_counts.index = [f'Code {code}' for code in reason_counts.index]
+        tables['reason_counts'] = top_n_bucket(reason_counts, top_n)
+        tables['category_counts'] = category_counts
+        
+        vap_reason = cube.groupby(level=['vap', 'reason_code']).sum().unstack(fill_value=0)
+        vap_reason = top_n_bucket(vap_reason.loc[vap_reason.sum(axis=1).sort_values(ascending=False).index], top_n)
+        tables['vap_reason'] = top_n_bucket(vap_reason.T, top_n).T
+        
+        # 逐天 / 逐VAP 的 小时 x 原因 表，用于细分图表 (各取断连最多的 top_n 个，图表数量不随时间跨度增长)
+        hours = range(24)
+        for level, key in (('date', 'per_day'), ('vap', 'per_vap')):
+            grouped = cube.groupby(level=[level, 'hour', 'reason_code']).sum()
+            totals = grouped.groupby(level=level).sum().sort_values(ascending=False)
+            for name in sorted(totals.index[:top_n]):
+                table = grouped.xs(name, level=level).unstack(fill_value=0).reindex(hours, fill_value=0)
+                tables[key][str(name)] = top_n_bucket(table.T, top_n).T
+        
+        return tables
+    
+    def get_reason_category(self, reason_code):
+        """返回reason code所属的类别"""
+        for category, codes in self.reason_categories.items():
+            if reason_code in codes:
+                return category
+        return "Other"
+    
+    def visualize_data(self, df, output='optimized_wifi_analysis', formats=('png',), top_n=10,
+                       detail_charts=False, workers=None, dpi=150, show=True):
+        """数据可视化
+        
+        output 为输出文件前缀；formats 可包含 png、svg、html (html 为内嵌所有图表的单个文件)。
+        detail_charts 为 True 时额外在工作进程中并行渲染断连最多的 top_n 天和 top_n 个VAP的细分图表。
+        """
         print("\n=== 生成可视化图表 ===")
         
+        tables = self.build_plot_tables(df, top_n=top_n)
+        
         # 创建子图
         fig, axes = plt.subplots(2, 2, figsize=(15, 12))
         fig.suptitle('Optimized WiFi Log Analysis', fontsize=16)
         
-        disassoc_df = df[df['event_type'] == 'disassoc']
-        
         # 1. Reason Code分布
-        if not disassoc_df.empty:
-            reason_counts = disassoc_df['reason_code'].value_counts().sort_index()
-            
+        reason_counts = tables['reason_counts']
+        if not reason_counts.empty:
             ax1 = axes[0, 0]
-            bars = ax1.bar(range(len(reason_counts)), reason_counts.values, 
-                          color=['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b'])
+            bars = ax1.bar(range(len(reason_counts)), reason_counts.values, color=palette(len(reason_counts)))
             ax1.set_xlabel('Reason Code')
             ax1.set_ylabel('Count')
             ax1.set_title('Disconnect Reason Distribution')
             ax1.set_xticks(range(len(reason_counts)))
-            ax1.set_xticklabels([f'Code {code}' for code in reason_counts.index], rotation=45)
+            ax1.set_xticklabels(reason_counts.index, rotation=45)
             
             # 添加数值标签
             for bar, count in zip(bars, reason_counts.values):
@@ -296,21 +401,18 @@ class OptimizedWiFiAnalyzer:
                         str(count), ha='center', va='bottom')
         
         # 2. 按类别分布
-        if not disassoc_df.empty:
-            category_counts = disassoc_df['reason_category'].value_counts()
-            
+        category_counts = tables['category_counts']
+        if not category_counts.empty:
             ax2 = axes[0, 1]
-            colors = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99']
-            ax2.pie(category_counts.values, labels=category_counts.index, autopct='%1.1f%%', colors=colors)
+            ax2.pie(category_counts.values, labels=category_counts.index, autopct='%1.1f%%',
+                    colors=palette(len(category_counts), 'Pastel1'))
             ax2.set_title('Reason Category Distribution')
         
         # 3. 时间分布
-        client_df = df[df['event_type'].isin(['assoc', 'disassoc'])]
-        if not client_df.empty:
-            hour_counts = client_df.groupby(['hour', 'event_type']).size().unstack(fill_value=0)
-            
+        hour_counts = tables['hour_event']
+        if not hour_counts.empty:
             ax3 = axes[1, 0]
-            hour_counts.plot(kind='bar', ax=ax3, width=0.8)
+            hour_counts.plot(kind='bar', ax=ax3, width=0.8, color=palette(len(hour_counts.columns)))
             ax3.set_xlabel('Hour of Day')
             ax3.set_ylabel('Event Count')
             ax3.set_title('Events by Hour')
@@ -318,22 +420,42 @@ class OptimizedWiFiAnalyzer:
             ax3.tick_params(axis='x', rotation=45)
         
         # 4. VAP分布
-        if not disassoc_df.empty:
-            vap_reason = disassoc_df.groupby(['vap', 'reason_code']).size().unstack(fill_value=0)
-            
+        vap_reason = tables['vap_reason']
+        if not vap_reason.empty:
             ax4 = axes[1, 1]
-            vap_reason.plot(kind='bar', ax=ax4, width=0.8)
+            vap_reason.plot(kind='bar', ax=ax4, width=0.8, color=palette(len(vap_reason.columns)))
             ax4.set_xlabel('VAP Interface')
             ax4.set_ylabel('Disconnect Count')
-            ax4.set_title('Disconnects by VAP and Reason')
+            ax4.set_title(f'Disconnects by VAP and Reason (top {top_n})')
             ax4.legend(title='Reason Code', bbox_to_anchor=(1.05, 1), loc='upper left')
-            ax4.tick_params(axis='x', rotation=0)
+            ax4.tick_params(axis='x', rotation=0 if len(vap_reason) <= 6 else 45)
         
         plt.tight_layout()
-        plt.savefig('optimized_wifi_analysis.png', dpi=150, bbox_inches='tight')
-        plt.show()
-        
-        print("图表已保存为 optimized_wifi_analysis.png")
+        saved_files, overview_svg = save_figure(fig, output, formats, dpi)
+        if show:
+            plt.show()
+        plt.close(fig)
+        
+        # 逐天 / 逐VAP 细分图表在工作进程中并行渲染
+        details = []
+        if detail_charts:
+            tasks = [(f"{output}_{kind}_{name}", f"{title} {name}", table, formats, dpi)
+                     for kind, title, key in (('day', 'Disconnects on', 'per_day'), ('vap', 'Disconnects on VAP', 'per_vap'))
+                     for name, table in tables[key].items()]
+            if tasks:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    details = list(pool.map(render_hourly_reason_chart, tasks))
+                for files, _, _ in details:
+                    saved_files.extend(files)
+                print(f"并行生成 {len(details)} 个细分图表")
+        
+        if 'html' in formats:
+            html_file = f"{output}.html"
+            write_html_report(html_file, 'Optimized WiFi Log Analysis', overview_svg,
+                              [(title, svg) for _, title, svg in details])
+            saved_files.append(html_file)
+        
+        print(f"图表已保存为 {', '.join(saved_files)}")
     
     def generate_summary(self, df):
         """生成分析摘要"""
@@ -372,13 +494,93 @@ class OptimizedWiFiAnalyzer:
         print(f"✅ 时间连续性: 连续的时间序列")
         print(f"✅ reason vs reason code: 正确区分配置原因和断连原因")
 
+def top_n_bucket(data, n, other_label='Other'):
+    """保留数量最多的n项(Series)或n行(DataFrame)，其余合并为 other_label"""
+    if len(data) <= n:
+        return data
+    totals = data if isinstance(data, pd.Series) else data.sum(axis=1)
+    top = totals.sort_values(ascending=False).index[:n]
+    rest = data.drop(top).sum()
+    if isinstance(data, pd.Series):
+        return pd.concat([data.loc[top], pd.Series({other_label: rest})])
+    return pd.concat([data.loc[top], rest.to_frame(other_label).T])
+
+def palette(n, cmap_name='tab20'):
+    """从colormap中取n种颜色，数量不受固定调色板限制"""
+    cmap = plt.get_cmap(cmap_name)
+    size = getattr(cmap, 'N', 256)
+    if n <= size:
+        return [cmap(i % size) for i in range(n)]
+    return [cmap(i / max(n - 1, 1)) for i in range(n)]
+
+def save_figure(fig, output, formats, dpi):
+    """按格式保存图表，返回 (已保存文件列表, html所需的内联SVG文本)"""
+    saved_files = []
+    for fmt in formats:
+        if fmt in ('png', 'svg'):
+            filename = f"{output}.{fmt}"
+            fig.savefig(filename, dpi=dpi, bbox_inches='tight', format=fmt)
+            saved_files.append(filename)
+    
+    svg = None
+    if 'html' in formats:
+        buffer = io.StringIO()
+        fig.savefig(buffer, format='svg', bbox_inches='tight')
+        svg = buffer.getvalue()
+        svg = svg[svg.index('<svg'):]
+    return saved_files, svg
+
+def render_hourly_reason_chart(task):
+    """工作进程入口：渲染一张 小时 x 原因 的堆叠柱状图"""
+    output, title, table, formats, dpi = task
+    plt.switch_backend('Agg')
+    
+    fig, ax = plt.subplots(figsize=(12, 5))
+    table.plot(kind='bar', stacked=True, ax=ax, width=0.8, color=palette(len(table.columns)))
+    ax.set_title(title)
+    ax.set_xlabel('Hour of Day')
+    ax.set_ylabel('Disconnect Count')
+    ax.legend(title='Reason Code', bbox_to_anchor=(1.02, 1), loc='upper left')
+    ax.tick_params(axis='x', rotation=0)
+    fig.tight_layout()
+    
+    saved_files, svg = save_figure(fig, output, formats, dpi)
+    plt.close(fig)
+    return saved_files, title, svg
+
+def write_html_report(filename, title, overview_svg, details):
+    """把所有图表内联为SVG，写入单个自包含HTML文件"""
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write("<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n")
+        f.write(f"<title>{html.escape(title)}</title>\n")
+        f.write("<style>body{font-family:sans-serif;margin:24px} svg{max-width:100%;height:auto}</style>\n")
+        f.write("</head>\n<body>\n")
+        f.write(f"<h1>{html.escape(title)}</h1>\n")
+        if overview_svg:
+            f.write(f"<section>{overview_svg}</section>\n")
+        for detail_title, svg in details:
+            f.write(f"<section>\n<h2>{html.escape(detail_title)}</h2>\n{svg}</section>\n")
+        f.write("</body>\n</html>\n")
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='优化WiFi日志数据分析工具')
+    parser.add_argument('log_file', nargs='?', default='../ussawifievent_optimized.txt', help='输入日志文件路径（默认：../ussawifievent_optimized.txt）')
+    parser.add_argument('-o', '--output', default='optimized_wifi_analysis', help='图表输出文件前缀（默认：optimized_wifi_analysis）')
+    parser.add_argument('--format', nargs='+', default=['png'], choices=['png', 'svg', 'html'], help='图表输出格式（默认：png）')
+    parser.add_argument('--top-n', type=int, default=10, help='图表中保留的VAP/原因数量，其余合并为Other（默认：10）')
+    parser.add_argument('--detail-charts', action='store_true', help='并行生成逐天、逐VAP的细分图表')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='渲染细分图表的进程数（默认：CPU核数）')
+    parser.add_argument('--dedup-window', type=int, default=None, help='丢弃该秒数窗口内的重复事件（默认：不去重）')
+    parser.add_argument('--dialect', default='auto', choices=['auto'] + list(DIALECTS), help='日志方言（默认：auto，按文件开头检测）')
+    
+    args = parser.parse_args()
+    
     print("优化WiFi日志数据分析工具")
     print("=" * 50)
     
     # 初始化分析器
-    analyzer = OptimizedWiFiAnalyzer('../ussawifievent_optimized.txt')
+    analyzer = OptimizedWiFiAnalyzer(args.log_file, dedup_window=args.dedup_window, dialect=args.dialect)
     
     try:
         # 解析数据
@@ -391,14 +593,15 @@ def main():
         analyzer.analyze_time_patterns(df)
         
         # 生成可视化图表
-        analyzer.visualize_data(df)
+        analyzer.visualize_data(df, output=args.output, formats=args.format, top_n=args.top_n,
+                                detail_charts=args.detail_charts, workers=args.workers)
         
         print("\n✅ 分析完成！")
         print("🎯 数据集已优化，包含6种主要断连原因")
         print("📊 可用于机器学习模型训练")
         
     except FileNotFoundError:
-        print("错误: 找不到日志文件 '../ussawifievent_optimized.txt'")
+        print(f"错误: 找不到日志文件 '{args.log_file}'")
         print("请确保已运行数据生成脚本")
     except Exception as e:
         print(f"分析过程中出现错误: {e}")
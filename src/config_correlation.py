@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置变更与断连关联分析脚本
+======================
+
+功能说明:
+- 将 reason=[..], oldCh->newCh=[..] 系统参数变化行解析为带类型的配置变更记录
+  (信道、带宽、发射功率)
+- 通过按时间排序的数组 + 二分查找(numpy.searchsorted)做 as-of 关联:
+  每个断连事件归属到它之前最近的一次配置变更，且间隔不超过指定窗口
+- 统计每次配置变更引起的断连次数、受影响客户端数和断连原因分布
+- 与全时段平均断连速率对比，给出提升倍数(lift)
+
+性能:
+- 解析阶段只保存紧凑的整数/浮点数组，不保存事件字典
+- 关联阶段为 O((M + N) log M) 的向量化计算，可扩展到百万级事件
+
+使用方法:
+    python config_correlation.py ../ussawifievent_optimized.txt --window 300
+    python config_correlation.py ../ussawifievent_optimized.txt -o config_disruptions.csv
+
+注意:
+- 配置变更行不包含VAP信息，因此按AP整体关联
+- reason=[数字] 为配置变更原因，reason code=[数字] 为断连原因，二者含义不同
+"""
+
+import argparse
+import csv
+from array import array
+from typing import NamedTuple, Optional
+from datetime import datetime
+
+import numpy as np
+
+from analyze_optimized_data import OptimizedWiFiAnalyzer
+
+
+class ConfigChange(NamedTuple):
+    """一次系统参数(信道/带宽/发射功率)变化"""
+    timestamp: datetime
+    config_reason: int
+    old_channel: int
+    new_channel: int
+    old_bandwidth: Optional[str]
+    new_bandwidth: Optional[str]
+    old_tx_power: Optional[float]
+    new_tx_power: Optional[float]
+    line_num: int
+
+    @classmethod
+    def from_event(cls, event):
+        """由 OptimizedWiFiAnalyzer 解析出的 config_change 事件构造"""
+        return cls(
+            timestamp=event['timestamp'],
+            config_reason=event['config_reason'],
+            old_channel=event['old_channel'],
+            new_channel=event['new_channel'],
+            old_bandwidth=event.get('old_bandwidth'),
+            new_bandwidth=event.get('new_bandwidth'),
+            old_tx_power=event.get('old_tx_power'),
+            new_tx_power=event.get('new_tx_power'),
+            line_num=event['line_num']
+        )
+
+    @property
+    def changed_fields(self):
+        """实际发生变化的参数"""
+        fields = []
+        if self.old_channel != self.new_channel:
+            fields.append('channel')
+        if self.old_bandwidth != self.new_bandwidth:
+            fields.append('bandwidth')
+        if self.old_tx_power != self.new_tx_power:
+            fields.append('tx_power')
+        return fields
+
+
+class ChangeDisruption(NamedTuple):
+    """单次配置变更的断连归因结果"""
+    change: ConfigChange
+    disconnects: int
+    affected_clients: int
+    reason_counts: dict
+    lift: float
+
+
+class DisconnectIndex:
+    """按时间索引的断连事件数组(紧凑存储)"""
+
+    def __init__(self):
+        self.times = array('d')     # epoch 秒
+        self.reasons = array('q')   # reason code (无则为 -1)
+        self.clients = array('q')   # 客户端ID (字符串驻留为整数)
+        self.client_ids = {}
+
+    def add(self, event):
+        client_id = self.client_ids.setdefault(event['client_mac'], len(self.client_ids))
+        self.times.append(event['timestamp'].timestamp())
+        self.reasons.append(event['reason_code'] if event['reason_code'] is not None else -1)
+        self.clients.append(client_id)
+
+    def __len__(self):
+        return len(self.times)
+
+    def as_sorted_arrays(self):
+        """按时间稳定排序后的 (times, reasons, clients) numpy数组"""
+        times = np.frombuffer(self.times, dtype=np.float64)
+        reasons = np.frombuffer(self.reasons, dtype=np.int64)
+        clients = np.frombuffer(self.clients, dtype=np.int64)
+        order = np.argsort(times, kind='stable')
+        return times[order], reasons[order], clients[order]
+
+
+def load_changes_and_disconnects(analyzer):
+    """单次遍历日志，收集配置变更记录和断连索引"""
+    changes = []
+    disconnects = DisconnectIndex()
+    for event in analyzer.iter_log_events():
+        if event['event_type'] == 'disassoc':
+            disconnects.add(event)
+        elif event['event_type'] == 'config_change':
+            changes.append(ConfigChange.from_event(event))
+    return changes, disconnects
+
+
+def correlate_disconnects(changes, disconnects, window_seconds=300):
+    """as-of关联：把每个断连归属到之前window_seconds秒内最近的一次配置变更
+
+    返回与 changes 顺序一致的 ChangeDisruption 列表。
+    """
+    if not changes:
+        return []
+
+    change_times = np.array([change.timestamp.timestamp() for change in changes], dtype=np.float64)
+    change_order = np.argsort(change_times, kind='stable')
+    sorted_change_times = change_times[change_order]
+
+    times, reasons, clients = disconnects.as_sorted_arrays()
+
+    # 每个断连之前(含同一时刻)最近的一次配置变更
+    position = np.searchsorted(sorted_change_times, times, side='right') - 1
+    matched = position >= 0
+    matched[matched] = times[matched] - sorted_change_times[position[matched]] <= window_seconds
+
+    change_index = change_order[position[matched]]
+    matched_reasons = reasons[matched]
+    matched_clients = clients[matched]
+
+    disruption_counts = np.bincount(change_index, minlength=len(changes))
+
+    # 每次变更影响的唯一客户端数
+    client_space = max(len(disconnects.client_ids), 1)
+    pairs = np.unique(change_index * client_space + matched_clients)
+    affected = np.bincount(pairs // client_space, minlength=len(changes))
+
+    # 每次变更的断连原因分布
+    reason_values, reason_slot = np.unique(matched_reasons, return_inverse=True)
+    reason_matrix = np.zeros((len(changes), len(reason_values)), dtype=np.int64)
+    np.add.at(reason_matrix, (change_index, reason_slot.reshape(-1)), 1)
+
+    # 全时段平均断连速率作为基线
+    if len(times) > 1 and times[-1] > times[0]:
+        expected = len(times) / (times[-1] - times[0]) * window_seconds
+    else:
+        expected = 0.0
+
+    results = []
+    for i, change in enumerate(changes):
+        reason_counts = {int(code): int(count)
+                         for code, count in zip(reason_values, reason_matrix[i]) if count}
+        count = int(disruption_counts[i])
+        results.append(ChangeDisruption(
+            change=change,
+            disconnects=count,
+            affected_clients=int(affected[i]),
+            reason_counts=reason_counts,
+            lift=count / expected if expected else 0.0
+        ))
+    return results
+
+
+def write_report(results, output_file):
+    """把每次配置变更的归因结果写入CSV"""
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'config_reason', 'old_channel', 'new_channel', 'old_bandwidth',
+                         'new_bandwidth', 'old_tx_power', 'new_tx_power', 'changed_fields',
+                         'disconnects', 'affected_clients', 'reason_counts', 'lift'])
+        for result in results:
+            change = result.change
+            writer.writerow([change.timestamp, change.config_reason, change.old_channel, change.new_channel,
+                             change.old_bandwidth, change.new_bandwidth, change.old_tx_power,
+                             change.new_tx_power, '|'.join(change.changed_fields), result.disconnects,
+                             result.affected_clients,
+                             ' '.join(f"{code}:{count}" for code, count in sorted(result.reason_counts.items())),
+                             f"{result.lift:.2f}"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='配置变更与断连关联分析工具')
+    parser.add_argument('log_file', help='输入日志文件路径')
+    parser.add_argument('-w', '--window', type=int, default=300, help='配置变更后的归因窗口秒数（默认：300）')
+    parser.add_argument('-o', '--output', default=None, help='逐变更归因结果CSV输出路径')
+    parser.add_argument('--dedup-window', type=int, default=None, help='丢弃该秒数窗口内的重复事件（默认：不去重）')
+
+    args = parser.parse_args()
+
+    analyzer = OptimizedWiFiAnalyzer(args.log_file, dedup_window=args.dedup_window)
+    print("正在解析配置变更和断连事件...")
+    changes, disconnects = load_changes_and_disconnects(analyzer)
+    print(f"配置变更: {len(changes)} 次, 断连事件: {len(disconnects)} 个")
+
+    results = correlate_disconnects(changes, disconnects, window_seconds=args.window)
+    attributed = sum(result.disconnects for result in results)
+
+    print(f"\n=== 配置变更后 {args.window}s 内的断连 ===")
+    for result in sorted(results, key=lambda r: r.disconnects, reverse=True):
+        change = result.change
+        reasons = ', '.join(f"Code {code}: {count}" for code, count in sorted(result.reason_counts.items()))
+        print(f"  {change.timestamp} reason={change.config_reason} "
+              f"Ch {change.old_channel}->{change.new_channel}, "
+              f"Bw {change.old_bandwidth}->{change.new_bandwidth}, "
+              f"TxPower {change.old_tx_power}->{change.new_tx_power}")
+        print(f"    断连: {result.disconnects}次, 受影响客户端: {result.affected_clients}个, "
+              f"lift: {result.lift:.2f}" + (f" ({reasons})" if reasons else ""))
+
+    if len(disconnects):
+        print(f"\n归因到配置变更的断连: {attributed}/{len(disconnects)} "
+              f"({attributed / len(disconnects) * 100:.1f}%)")
+
+    if args.output:
+        write_report(results, args.output)
+        print(f"结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
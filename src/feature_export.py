@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WiFi会话机器学习特征导出脚本
+========================
+
+功能说明:
+- 单次遍历日志，把assoc/disassoc事件转换为逐会话的模型输入特征
+- 事件按块(chunk)缓存为紧凑数组，每块用NumPy向量化计算特征
+  (不使用逐行pandas循环)，跨块状态只保留每个客户端最近的少量事件
+- 特征矩阵(float32)和标签向量(int32)分块追加写入 .npy 文件，
+  可用 numpy.load(..., mmap_mode='r') 以内存映射方式加载，
+  因此训练集可以大于内存
+
+会话定义与 analyze_client_sessions 一致:
+- assoc 记录开始，同一客户端随后的 disassoc 结束会话
+- 日志需按时间顺序写入：块内的乱序事件会按时间重排，跨块的乱序无法重排
+
+每个会话的特征:
+- duration_seconds: 会话时长
+- seconds_since_last_disconnect: 本次assoc距该客户端上一次断连的时间(无则为-1)
+- vap_switch: 本次assoc的VAP与上一次断连的VAP不同
+- vap_changed_in_session: 会话中assoc与disassoc的VAP不同
+- hour_sin / hour_cos: assoc时刻(小时)的周期编码
+- reason_code: 本次会话的断连原因
+- recent_reason_*: 该客户端最近N次断连(含本次)中各原因的次数
+
+标签:
+- 该客户端下一次断连的 reason code；客户端最后一个会话没有标签，不导出
+
+使用方法:
+    python feature_export.py ../ussawifievent_optimized.txt -o wifi_features
+    python -c "import numpy as np; X = np.load('wifi_features_X.npy', mmap_mode='r')"
+
+输出文件:
+- <prefix>_X.npy: float32 特征矩阵 (行数 x 特征数)
+- <prefix>_y.npy: int32 标签向量
+- <prefix>_meta.json: 特征名、reason code列表等元数据
+"""
+
+import argparse
+import json
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+from analyze_optimized_data import OptimizedWiFiAnalyzer
+
+
+REASON_CODES = [1, 3, 4, 5, 15, 23]
+
+FEATURE_NAMES = [
+    'duration_seconds',
+    'seconds_since_last_disconnect',
+    'vap_switch',
+    'vap_changed_in_session',
+    'hour_sin',
+    'hour_cos',
+    'reason_code',
+] + [f'recent_reason_{code}' for code in REASON_CODES] + ['recent_reason_other']
+
+EPOCH = datetime(1970, 1, 1)
+NPY_HEADER_SIZE = 128
+
+
+class NpyAppender:
+    """以追加方式写入 .npy 文件，关闭时回填最终行数"""
+
+    def __init__(self, path, dtype, columns=None):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.columns = columns
+        self.rows = 0
+        self.file = open(path, 'wb')
+        self.file.write(self._header())
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self.file.write(values.tobytes())
+        self.rows += len(values)
+
+    def close(self):
+        self.file.seek(0)
+        self.file.write(self._header())
+        self.file.close()
+
+    def _header(self):
+        # 固定长度的头部，行数变化时可以原地回填
+        shape = (self.rows, self.columns) if self.columns is not None else (self.rows,)
+        header = repr({'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': shape})
+        header = header.encode('latin1').ljust(NPY_HEADER_SIZE - 10 - 1) + b'\n'
+        return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header
+
+
+class SessionFeatureExtractor:
+    """分块向量化计算会话特征"""
+
+    def __init__(self, history=5):
+        self.history = history
+        self.client_ids = {}
+        self.vap_ids = {}
+        # reason code -> 特征列的查找表，未知原因归入 other
+        self.reason_lookup = np.full(max(REASON_CODES) + 1, len(REASON_CODES), dtype=np.int64)
+        self.reason_lookup[REASON_CODES] = np.arange(len(REASON_CODES))
+
+        # 跨块状态: 每个客户端最近的事件 (时间, 客户端, 是否断连, VAP, reason code)
+        self.carry = self._empty_events()
+        # 已算出特征但还在等待下一次断连作为标签的会话
+        self.pending_features = np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32)
+        self.pending_clients = np.zeros(0, dtype=np.int64)
+
+    @staticmethod
+    def _empty_events():
+        return (np.zeros(0, dtype=np.float64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool),
+                np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+    def new_chunk(self):
+        """返回用于缓存一个块事件的紧凑数组"""
+        return array('d'), array('q'), array('b'), array('q'), array('q')
+
+    def add_event(self, chunk, event):
+        """把一个assoc/disassoc事件追加到块缓存中"""
+        times, clients, is_disassoc, vaps, reasons = chunk
+        times.append((event['timestamp'] - EPOCH).total_seconds())
+        clients.append(self.client_ids.setdefault(event['client_mac'], len(self.client_ids)))
+        is_disassoc.append(event['event_type'] == 'disassoc')
+        vaps.append(self.vap_ids.setdefault(event['vap'], len(self.vap_ids)))
+        reasons.append(event['reason_code'] if event['reason_code'] is not None else -1)
+
+    def process_chunk(self, chunk):
+        """计算一个块内所有会话的特征，返回 (已确定标签的特征, 标签)"""
+        times, clients, is_disassoc, vaps, reasons = chunk
+        chunk_arrays = (np.frombuffer(times, dtype=np.float64), np.frombuffer(clients, dtype=np.int64),
+                        np.frombuffer(is_disassoc, dtype=np.int8).astype(bool),
+                        np.frombuffer(vaps, dtype=np.int64), np.frombuffer(reasons, dtype=np.int64))
+
+        # 上一块留下的事件排在本块之前
+        n_carry = len(self.carry[0])
+        t, cid, dis, vap, rc = (np.concatenate([c, x]) for c, x in zip(self.carry, chunk_arrays))
+        from_chunk = np.arange(len(t)) >= n_carry
+
+        # 按 客户端 -> 上一块在前 -> 时间 -> 原始顺序 排序
+        order = np.lexsort((np.arange(len(t)), t, from_chunk, cid))
+        t, cid, dis, vap, rc, from_chunk = t[order], cid[order], dis[order], vap[order], rc[order], from_chunk[order]
+        n = len(t)
+        if n == 0:
+            return self._empty_output()
+
+        new_group = np.ones(n, dtype=bool)
+        new_group[1:] = cid[1:] != cid[:-1]
+
+        # 会话结束行: 本块中的disassoc，且同一客户端的前一个事件是assoc
+        prev_is_assoc = np.zeros(n, dtype=bool)
+        prev_is_assoc[1:] = ~dis[:-1] & ~new_group[1:]
+        closes_session = dis & prev_is_assoc & from_chunk
+
+        # 断连序列 (按客户端分组、组内按时间)
+        d_rows = np.flatnonzero(dis)
+        d_t, d_cid, d_vap, d_rc = t[d_rows], cid[d_rows], vap[d_rows], rc[d_rows]
+        n_d = len(d_rows)
+        d_new_group = np.ones(n_d, dtype=bool)
+        d_new_group[1:] = d_cid[1:] != d_cid[:-1]
+        d_index = np.arange(n_d)
+        d_group_start = np.maximum.accumulate(np.where(d_new_group, d_index, 0))
+        d_group_id = np.cumsum(d_new_group) - 1
+        d_group_end = np.r_[np.flatnonzero(d_new_group)[1:], n_d][d_group_id] - 1
+
+        # 最近N次断连(含本次)的原因计数: 组内累加和之差
+        slot = np.full(n_d, len(REASON_CODES), dtype=np.int64)
+        known = (d_rc >= 0) & (d_rc < len(self.reason_lookup))
+        slot[known] = self.reason_lookup[d_rc[known]]
+        one_hot = np.zeros((n_d, len(REASON_CODES) + 1), dtype=np.int64)
+        one_hot[d_index, slot] = 1
+        cumulative = np.vstack([np.zeros((1, one_hot.shape[1]), dtype=np.int64), np.cumsum(one_hot, axis=0)])
+
+        # 下一次断连的原因 (组内下一个)
+        has_next = np.zeros(n_d, dtype=bool)
+        has_next[:-1] = ~d_new_group[1:]
+        next_rc = np.full(n_d, -1, dtype=np.int64)
+        next_rc[:-1] = d_rc[1:]
+
+        # 断连行在 d_* 数组中的位置
+        d_position = np.full(n, -1, dtype=np.int64)
+        d_position[d_rows] = d_index
+
+        session_rows = np.flatnonzero(closes_session)
+        j = d_position[session_rows]
+        assoc_rows = session_rows - 1
+        assoc_t = t[assoc_rows]
+
+        has_prev = j > d_group_start[j]
+        prev_j = np.where(has_prev, j - 1, 0)
+        lower = np.maximum(j - self.history + 1, d_group_start[j])
+        hour = (assoc_t // 3600) % 24
+
+        features = np.empty((len(session_rows), len(FEATURE_NAMES)), dtype=np.float32)
+        features[:, 0] = t[session_rows] - assoc_t
+        features[:, 1] = np.where(has_prev, assoc_t - d_t[prev_j], -1)
+        features[:, 2] = has_prev & (vap[assoc_rows] != d_vap[prev_j])
+        features[:, 3] = vap[assoc_rows] != vap[session_rows]
+        features[:, 4] = np.sin(2 * np.pi * hour / 24)
+        features[:, 5] = np.cos(2 * np.pi * hour / 24)
+        features[:, 6] = rc[session_rows]
+        features[:, 7:] = cumulative[j + 1] - cumulative[lower]
+
+        labeled = has_next[j]
+        out_features = [features[labeled]]
+        out_labels = [next_rc[j][labeled]]
+
+        # 上一块中等待标签的会话: 取该客户端在本块中的第一次断连
+        d_from_chunk = from_chunk[d_rows]
+        first_cids, first_index = np.unique(d_cid[d_from_chunk], return_index=True)
+        first_rc = d_rc[d_from_chunk][first_index]
+        where = np.searchsorted(first_cids, self.pending_clients)
+        where = np.clip(where, 0, max(len(first_cids) - 1, 0))
+        resolved = (first_cids[where] == self.pending_clients) if len(first_cids) else np.zeros(len(self.pending_clients), dtype=bool)
+        out_features.insert(0, self.pending_features[resolved])
+        out_labels.insert(0, first_rc[where[resolved]])
+
+        # 新的等待标签的会话 (每个客户端至多一个)
+        self.pending_features = np.concatenate([self.pending_features[~resolved], features[~labeled]])
+        self.pending_clients = np.concatenate([self.pending_clients[~resolved], cid[session_rows][~labeled]])
+
+        # 新的跨块状态: 每个客户端的最后一个事件 + 最近N次断连
+        keep = np.zeros(n, dtype=bool)
+        keep[np.r_[np.flatnonzero(new_group)[1:], n] - 1] = True
+        keep[d_rows[d_group_end - d_index < self.history]] = True
+        self.carry = (t[keep], cid[keep], dis[keep], vap[keep], rc[keep])
+
+        return np.concatenate(out_features), np.concatenate(out_labels).astype(np.int32)
+
+    @staticmethod
+    def _empty_output():
+        return np.zeros((0, len(FEATURE_NAMES)), dtype=np.float32), np.zeros(0, dtype=np.int32)
+
+
+def export_features(log_file, output_prefix, chunk_size=100000, history=5, dedup_window=None):
+    """单次遍历日志，分块导出特征矩阵和标签向量，返回导出的行数"""
+    analyzer = OptimizedWiFiAnalyzer(log_file, dedup_window=dedup_window)
+    extractor = SessionFeatureExtractor(history=history)
+    features_file = NpyAppender(f"{output_prefix}_X.npy", np.float32, columns=len(FEATURE_NAMES))
+    labels_file = NpyAppender(f"{output_prefix}_y.npy", np.int32)
+
+    def flush(chunk):
+        features, labels = extractor.process_chunk(chunk)
+        features_file.append(features)
+        labels_file.append(labels)
+
+    try:
+        chunk = extractor.new_chunk()
+        for event in analyzer.iter_log_events():
+            if event['event_type'] not in ('assoc', 'disassoc'):
+                continue
+            extractor.add_event(chunk, event)
+            if len(chunk[0]) >= chunk_size:
+                flush(chunk)
+                chunk = extractor.new_chunk()
+        flush(chunk)
+    finally:
+        features_file.close()
+        labels_file.close()
+
+    with open(f"{output_prefix}_meta.json", 'w', encoding='utf-8') as f:
+        json.dump({
+            'feature_names': FEATURE_NAMES,
+            'reason_codes': REASON_CODES,
+            'history': history,
+            'rows': features_file.rows,
+            'clients': len(extractor.client_ids),
+            'vaps': sorted(extractor.vap_ids, key=extractor.vap_ids.get),
+            'unlabeled_sessions': len(extractor.pending_clients)
+        }, f, indent=2)
+
+    return features_file.rows, len(extractor.pending_clients)
+
+
+def load_training_set(output_prefix):
+    """以内存映射方式加载导出的特征矩阵和标签向量"""
+    features = np.load(f"{output_prefix}_X.npy", mmap_mode='r')
+    labels = np.load(f"{output_prefix}_y.npy", mmap_mode='r')
+    return features, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WiFi会话机器学习特征导出工具')
+    parser.add_argument('log_file', help='输入日志文件路径')
+    parser.add_argument('-o', '--output', default='wifi_features', help='输出文件前缀（默认：wifi_features）')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='每块事件数（默认：100000）')
+    parser.add_argument('--history', type=int, default=5, help='统计最近几次断连的原因（默认：5）')
+    parser.add_argument('--dedup-window', type=int, default=None, help='丢弃该秒数窗口内的重复事件（默认：不去重）')
+
+    args = parser.parse_args()
+
+    print("正在导出会话特征...")
+    rows, unlabeled = export_features(args.log_file, args.output, chunk_size=args.chunk_size, history=args.history,
+                                      dedup_window=args.dedup_window)
+
+    print(f"导出 {rows} 个带标签的会话，{len(FEATURE_NAMES)} 个特征")
+    print(f"客户端最后一个会话没有后续断连作为标签，未导出: {unlabeled} 个")
+    print(f"特征矩阵: {args.output}_X.npy")
+    print(f"标签向量: {args.output}_y.npy")
+    print(f"元数据: {args.output}_meta.json")
+
+
+if __name__ == "__main__":
+    main()
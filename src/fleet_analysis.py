@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WiFi多AP(Fleet)日志并行分析脚本
+============================
+
+功能说明:
+- 对成百上千个AP日志文件并行执行与 OptimizedWiFiAnalyzer 相同的分析
+- 每个AP日志在独立的工作进程中流式解析，只产出紧凑的部分聚合结果
+  (断连原因计数、客户端会话统计、每小时直方图)
+- 部分聚合结果满足结合律，可按任意顺序合并为整网(fleet)报告
+- 每个AP的摘要逐行写入CSV，不在内存中保留所有AP的数据
+
+内存占用:
+- 原始事件只存在于工作进程中，且每次只处理一个AP日志
+- 主进程只保留一个合并后的计数聚合结果，内存与工作进程数相关，与AP数量无关
+- 每个AP的客户端会话统计按客户端排序写入临时文件，报告时k路归并，
+  只在内存中保留唯一客户端数和会话数最多的top N个客户端
+
+使用方法:
+    python fleet_analysis.py logs/*.txt -j 8 --per-ap-report per_ap_report.csv
+
+注意:
+- 会话配对在单个AP日志内进行(日志按时间顺序写入)，跨AP不配对
+- AP名称取日志文件名(不含扩展名)
+"""
+
+import argparse
+import csv
+import functools
+import heapq
+import itertools
+import json
+import os
+import tempfile
+from collections import Counter
+from multiprocessing import Pool
+from operator import itemgetter
+
+from analyze_optimized_data import OptimizedWiFiAnalyzer
+
+MAX_OPEN_RUNS = 64  # 同时打开的客户端统计批次数上限，超过时先归并为一个
+
+
+class APPartial:
+    """单个AP(或多个AP合并后)的紧凑部分聚合结果"""
+
+    def __init__(self, ap_name=None):
+        self.ap_name = ap_name
+        self.ap_count = 1 if ap_name else 0
+        self.event_counts = Counter()        # event_type -> 次数
+        self.reason_counts = Counter()       # reason_code -> 断连次数
+        self.hourly_reasons = Counter()      # (hour, reason_code) -> 断连次数
+        self.hourly_events = Counter()       # (hour, event_type) -> 事件次数
+        self.client_stats = {}               # client_mac -> [会话数, 总时长(分钟), Counter(reason_code)]
+        self.session_count = 0               # 完整会话数(client_stats 写入磁盘后仍保留)
+        self.first_timestamp = None
+        self.last_timestamp = None
+
+    def add_event(self, event):
+        """累加单个事件的计数(不含会话配对)"""
+        event_type = event['event_type']
+        timestamp = event['timestamp']
+        self.event_counts[event_type] += 1
+
+        if self.first_timestamp is None or timestamp < self.first_timestamp:
+            self.first_timestamp = timestamp
+        if self.last_timestamp is None or timestamp > self.last_timestamp:
+            self.last_timestamp = timestamp
+
+        if event_type in ('assoc', 'disassoc'):
+            self.hourly_events[(timestamp.hour, event_type)] += 1
+        if event_type == 'disassoc':
+            self.reason_counts[event['reason_code']] += 1
+            self.hourly_reasons[(timestamp.hour, event['reason_code'])] += 1
+
+    def add_session(self, client_mac, duration_minutes, reason_code):
+        """累加一个完整的assoc->disassoc会话"""
+        stats = self.client_stats.get(client_mac)
+        if stats is None:
+            stats = self.client_stats[client_mac] = [0, 0.0, Counter()]
+        stats[0] += 1
+        stats[1] += duration_minutes
+        stats[2][reason_code] += 1
+        self.session_count += 1
+
+    def merge(self, other):
+        """合并另一个部分聚合结果(满足结合律和交换律)，返回self"""
+        self.ap_count += other.ap_count
+        self.event_counts.update(other.event_counts)
+        self.reason_counts.update(other.reason_counts)
+        self.hourly_reasons.update(other.hourly_reasons)
+        self.hourly_events.update(other.hourly_events)
+        self.session_count += other.session_count
+
+        for client_mac, (count, total_minutes, reasons) in other.client_stats.items():
+            stats = self.client_stats.get(client_mac)
+            if stats is None:
+                self.client_stats[client_mac] = [count, total_minutes, Counter(reasons)]
+            else:
+                stats[0] += count
+                stats[1] += total_minutes
+                stats[2].update(reasons)
+
+        if other.first_timestamp is not None:
+            if self.first_timestamp is None or other.first_timestamp < self.first_timestamp:
+                self.first_timestamp = other.first_timestamp
+        if other.last_timestamp is not None:
+            if self.last_timestamp is None or other.last_timestamp > self.last_timestamp:
+                self.last_timestamp = other.last_timestamp
+        return self
+
+    def peak_hours(self, n=3):
+        """断连次数最多的n个小时"""
+        by_hour = Counter()
+        for (hour, _), count in self.hourly_reasons.items():
+            by_hour[hour] += count
+        return [hour for hour, _ in by_hour.most_common(n)]
+
+    def summary_row(self):
+        """生成单行摘要，用于逐AP报告"""
+        top_reason = self.reason_counts.most_common(1)
+        peak_hours = self.peak_hours(1)
+        return {
+            'ap': self.ap_name,
+            'events': sum(self.event_counts.values()),
+            'assoc': self.event_counts['assoc'],
+            'disassoc': self.event_counts['disassoc'],
+            'config_change': self.event_counts['config_change'],
+            'sessions': self.session_count,
+            'clients': len(self.client_stats),
+            'top_reason_code': top_reason[0][0] if top_reason else '',
+            'top_reason_count': top_reason[0][1] if top_reason else 0,
+            'peak_hour': peak_hours[0] if peak_hours else '',
+            'first_timestamp': self.first_timestamp or '',
+            'last_timestamp': self.last_timestamp or '',
+        }
+
+
+class ClientStatsRuns:
+    """按客户端排序写入临时文件的客户端会话统计批次
+
+    每个AP的 client_stats 写成一个有序批次，报告时按客户端k路归并，
+    主进程内存与整网客户端总数无关。
+    """
+
+    def __init__(self, temp_dir=None):
+        self.temp_dir = temp_dir
+        self.runs = []
+
+    def add(self, client_stats):
+        """把一个AP的客户端统计写成有序批次"""
+        self.runs.append(self._write(sorted(client_stats.items())))
+        if len(self.runs) >= MAX_OPEN_RUNS:
+            merged = self._write(self)
+            self.close()
+            self.runs = [merged]
+
+    def _write(self, items):
+        run = tempfile.TemporaryFile('w+', encoding='utf-8', dir=self.temp_dir)
+        for client_mac, (count, total_minutes, reasons) in items:
+            run.write(json.dumps([client_mac, count, total_minutes, list(reasons.items())]) + '\n')
+        return run
+
+    @staticmethod
+    def _read(run):
+        run.seek(0)
+        for line in run:
+            yield json.loads(line)
+
+    def __iter__(self):
+        """按客户端顺序产出合并后的 (client_mac, [会话数, 总时长(分钟), Counter(reason_code)])"""
+        merged = heapq.merge(*(self._read(run) for run in self.runs), key=itemgetter(0))
+        for client_mac, records in itertools.groupby(merged, key=itemgetter(0)):
+            stats = [0, 0.0, Counter()]
+            for _, count, total_minutes, reasons in records:
+                stats[0] += count
+                stats[1] += total_minutes
+                for code, reason_count in reasons:
+                    stats[2][code] += reason_count
+            yield client_mac, stats
+
+    def summarize(self, n):
+        """一次归并遍历 -> (唯一客户端数, 会话数最多的n个客户端)"""
+        unique_clients = 0
+
+        def counted():
+            nonlocal unique_clients
+            for item in self:
+                unique_clients += 1
+                yield item
+
+        busiest = heapq.nlargest(n, counted(), key=lambda x: x[1][0])
+        return unique_clients, busiest
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+
+
+def analyze_ap_log(log_file, dedup_window=None):
+    """工作进程入口：流式解析一个AP日志并返回其部分聚合结果"""
+    ap_name = os.path.splitext(os.path.basename(log_file))[0]
+    analyzer = OptimizedWiFiAnalyzer(log_file, dedup_window=dedup_window)
+    partial = APPartial(ap_name)
+
+    # 与 analyze_client_sessions 一致：assoc 记录开始时间，随后的 disassoc 结束会话
+    current_assoc = {}
+    for event in analyzer.iter_log_events():
+        partial.add_event(event)
+
+        client_mac = event['client_mac']
+        if event['event_type'] == 'assoc':
+            current_assoc[client_mac] = event['timestamp']
+        elif event['event_type'] == 'disassoc':
+            assoc_time = current_assoc.pop(client_mac, None)
+            if assoc_time is not None:
+                duration = (event['timestamp'] - assoc_time).total_seconds() / 60  # 分钟
+                partial.add_session(client_mac, duration, event['reason_code'])
+
+    return partial
+
+
+class FleetWiFiAnalyzer:
+    """多AP日志并行分析器"""
+
+    PER_AP_FIELDS = ['ap', 'events', 'assoc', 'disassoc', 'config_change', 'sessions', 'clients',
+                     'top_reason_code', 'top_reason_count', 'peak_hour', 'first_timestamp', 'last_timestamp']
+
+    def __init__(self, log_files, workers=None, top_n=10, dedup_window=None, temp_dir=None):
+        self.log_files = list(log_files)
+        self.workers = workers or os.cpu_count() or 1
+        self.top_n = top_n
+        self.dedup_window = dedup_window  # 每个AP日志内的重复事件过滤窗口(秒)
+        self.top_aps = []  # 断连最多的top_n个AP摘要 (有界小顶堆)
+        self.client_runs = ClientStatsRuns(temp_dir)  # 客户端会话统计的磁盘批次
+
+        # 复用单AP分析器的reason code描述和类别定义
+        reference = OptimizedWiFiAnalyzer(None)
+        self.reason_code_mapping = reference.reason_code_mapping
+        self.reason_categories = reference.reason_categories
+
+    def analyze(self, per_ap_report=None):
+        """并行分析所有AP日志，返回合并后的整网聚合结果"""
+        print(f"正在使用 {self.workers} 个进程分析 {len(self.log_files)} 个AP日志...")
+
+        fleet = APPartial()
+        report_file = open(per_ap_report, 'w', newline='', encoding='utf-8') if per_ap_report else None
+        try:
+            writer = None
+            if report_file:
+                writer = csv.DictWriter(report_file, fieldnames=self.PER_AP_FIELDS)
+                writer.writeheader()
+
+            worker = functools.partial(analyze_ap_log, dedup_window=self.dedup_window)
+            with Pool(processes=self.workers) as pool:
+                for done, partial in enumerate(pool.imap_unordered(worker, self.log_files), 1):
+                    row = partial.summary_row()
+                    if writer:
+                        writer.writerow(row)
+                    self._track_top_ap(done, row)
+                    # 客户端统计写入磁盘批次，整网结果只合并计数
+                    self.client_runs.add(partial.client_stats)
+                    partial.client_stats = {}
+                    fleet.merge(partial)
+
+                    if done % 100 == 0:
+                        print(f"  已完成 {done}/{len(self.log_files)} 个AP")
+        finally:
+            if report_file:
+                report_file.close()
+
+        print(f"成功分析 {fleet.ap_count} 个AP日志")
+        return fleet
+
+    def _track_top_ap(self, seq, row):
+        item = (row['disassoc'], seq, row)
+        if len(self.top_aps) < self.top_n:
+            heapq.heappush(self.top_aps, item)
+        elif item[0] > self.top_aps[0][0]:
+            heapq.heapreplace(self.top_aps, item)
+
+    def close(self):
+        """删除客户端统计临时文件"""
+        self.client_runs.close()
+
+    def category_counts(self, fleet):
+        """按reason类别汇总断连次数"""
+        counts = Counter()
+        for code, count in fleet.reason_counts.items():
+            category = "Other"
+            for name, codes in self.reason_categories.items():
+                if code in codes:
+                    category = name
+                    break
+            counts[category] += count
+        return counts
+
+    def print_report(self, fleet):
+        """打印整网分析报告"""
+        print("\n=== 整网(Fleet)摘要 ===")
+        print(f"AP数: {fleet.ap_count}")
+        print(f"总事件数: {sum(fleet.event_counts.values())}")
+        print(f"连接事件数: {fleet.event_counts['assoc']}")
+        print(f"断连事件数: {fleet.event_counts['disassoc']}")
+        print(f"配置变更事件数: {fleet.event_counts['config_change']}")
+        unique_clients, busiest = self.client_runs.summarize(self.top_n)
+        print(f"完整会话数: {fleet.session_count}")
+        print(f"唯一客户端数: {unique_clients}")
+        if fleet.first_timestamp is not None:
+            print(f"数据时间跨度: {fleet.last_timestamp - fleet.first_timestamp}")
+
+        total_disconnects = fleet.event_counts['disassoc']
+        if not total_disconnects:
+            print("没有发现disassoc事件")
+            return
+
+        print("\n=== 断连原因分析 ===")
+        for code, count in sorted(fleet.reason_counts.items(), key=lambda x: (x[0] is None, x[0] or 0)):
+            description = self.reason_code_mapping.get(code, "未知")
+            percentage = (count / total_disconnects) * 100
+            print(f"  Code {code}: {count}次 ({percentage:.1f}%) - {description}")
+
+        print(f"\n按类别分布:")
+        for category, count in self.category_counts(fleet).most_common():
+            percentage = (count / total_disconnects) * 100
+            print(f"  {category}: {count}次 ({percentage:.1f}%)")
+
+        print("\n=== 客户端会话分析 ===")
+        print(f"会话数最多的 {len(busiest)} 个客户端:")
+        for client_mac, (count, total_minutes, reasons) in busiest:
+            most_common_reason = reasons.most_common(1)[0][0]
+            print(f"  {client_mac[-8:]}... :")
+            print(f"    会话数: {count}")
+            print(f"    平均时长: {total_minutes / count:.1f}分钟")
+            print(f"    总在线时间: {total_minutes:.1f}分钟")
+            print(f"    主要断连原因: Code {most_common_reason} - "
+                  f"{self.reason_code_mapping.get(most_common_reason, '未知')}")
+
+        print("\n=== 时间模式分析 ===")
+        print(f"断连高峰时段: {fleet.peak_hours(3)}")
+
+        print(f"\n=== 断连最多的 {len(self.top_aps)} 个AP ===")
+        for _, _, row in sorted(self.top_aps, key=lambda x: (-x[0], x[1])):
+            print(f"  {row['ap']}: 断连 {row['disassoc']}次, 客户端 {row['clients']}个, "
+                  f"主要原因 Code {row['top_reason_code']}, 高峰 {row['peak_hour']}时")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WiFi多AP日志并行分析工具')
+    parser.add_argument('log_files', nargs='+', help='AP日志文件路径(每个文件对应一个AP)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='工作进程数（默认：CPU核数）')
+    parser.add_argument('--per-ap-report', default=None, help='逐AP摘要CSV输出路径')
+    parser.add_argument('--top', type=int, default=10, help='报告中显示的AP/客户端数量（默认：10）')
+    parser.add_argument('--dedup-window', type=int, default=None, help='丢弃该秒数窗口内的重复事件（默认：不去重）')
+    parser.add_argument('--temp-dir', default=None, help='客户端统计临时文件目录（默认：系统临时目录）')
+
+    args = parser.parse_args()
+
+    print("WiFi多AP日志并行分析工具")
+    print("=" * 50)
+
+    analyzer = FleetWiFiAnalyzer(args.log_files, workers=args.workers, top_n=args.top,
+                                 dedup_window=args.dedup_window, temp_dir=args.temp_dir)
+    try:
+        fleet = analyzer.analyze(per_ap_report=args.per_ap_report)
+        analyzer.print_report(fleet)
+    finally:
+        analyzer.close()
+
+    if args.per_ap_report:
+        print(f"\n逐AP报告已保存到: {args.per_ap_report}")
+    print("\n✅ 分析完成！")
+
+
+if __name__ == "__main__":
+    main()
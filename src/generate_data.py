@@ -12,6 +12,8 @@ WiFi日志数据生成脚本
 
 使用方法:
     python generate_data.py
+    python generate_data.py --dialect wifid -n 100000 -o ../bench_wifid.txt
+    python generate_data.py --dialect all -n 100000 -o ../bench.txt   # 每种方言各生成一个文件
 
 输出统计:
 - 总事件数: 500+
@@ -25,12 +27,24 @@ WiFi日志数据生成脚本
 - reason code=[数字]: 断连原因 (分析重点)
 """
 
+import os
 import random
+import argparse
 from datetime import datetime, timedelta
 import math
 
+try:
+    import project_paths  # noqa: F401  项目根目录下的共享模块
+except ImportError:
+    from src import project_paths  # noqa: F401  在项目根目录以 src.xxx 方式导入时
+from log_common import DIALECTS, DEFAULT_DIALECT, DialectMatcher
+
 class WiFiLogGenerator:
-    def __init__(self):
+    def __init__(self, dialect=DEFAULT_DIALECT):
+        # 输出的日志方言
+        self.matcher = DialectMatcher(dialect)
+        self.dialect = self.matcher.fallback
+        
         # 6种主要断连原因
         self.reason_codes = {
             1: "未指定原因",
@@ -64,7 +78,7 @@ class WiFiLogGenerator:
         
     def generate_timestamp(self, base_time):
         """生成时间戳字符串"""
-        return base_time.strftime("%a %b %d %H:%M:%S")
+        return self.dialect.format_timestamp(base_time)
     
     def generate_config_change(self, timestamp):
         """生成配置变更事件"""
@@ -80,14 +94,23 @@ class WiFiLogGenerator:
         old_power = round(random.uniform(12.0, 20.0), 6)
         new_power = round(random.uniform(12.0, 20.0), 6)
         
-        return f"USSA > {timestamp} | NOTICE  | reason=[{reason}], oldCh->newCh=[{old_ch}]->[{new_ch}], oldBw->newBw=[{old_bw}]->[{new_bw}], oldTxPower->newTxPower=[{old_power:.6f}]->[{new_power:.6f}]"
+        return self.dialect.format_config_change(
+            timestamp, config_reason=reason, old_channel=old_ch, new_channel=new_ch,
+            old_bandwidth=old_bw, new_bandwidth=new_bw, old_tx_power=old_power, new_tx_power=new_power
+        )
     
     def generate_client_event(self, timestamp, mac, event_type, vap, reason_code=None):
         """生成客户端事件"""
+        # 方言支持的额外字段
+        extra = {}
+        if 'rssi' in self.dialect.client_fields:
+            extra['rssi'] = random.randint(-85, -40)
+        if 'channel' in self.dialect.client_fields:
+            extra['channel'] = random.choice([1, 6, 11, 36, 149])
+        
         if event_type == "assoc":
-            return f"USSA > {timestamp} | NOTICE  | reported client=[{mac}] assoc on vap=[{vap}]"
-        else:  # disassoc
-            return f"USSA > {timestamp} | NOTICE  | reported client=[{mac}] disassoc on vap=[{vap}], reason code=[{reason_code}]"
+            reason_code = None
+        return self.dialect.format_client_event(timestamp, mac, event_type, vap, reason_code, **extra)
     
     def generate_session(self, start_time, client_mac, vap):
         """生成一个完整的客户端会话 (assoc -> disassoc)"""
@@ -189,8 +212,9 @@ class WiFiLogGenerator:
         # 统计断连原因分布
         reason_counts = {}
         for event in events:
-            if "disassoc" in event and "reason code=" in event:
-                reason_code = int(event.split("reason code=[")[1].split("]")[0])
+            dialect, match = self.matcher.match(event)
+            if match is not None and match.group('reason_code'):
+                reason_code = int(match.group('reason_code'))
                 reason_counts[reason_code] = reason_counts.get(reason_code, 0) + 1
         
         print("\n断连原因分布:")
@@ -201,20 +225,34 @@ class WiFiLogGenerator:
         return len(events), reason_counts
 
 def main():
-    print("WiFi日志数据生成器")
-    print("=" * 50)
-    
-    generator = WiFiLogGenerator()
+    parser = argparse.ArgumentParser(description='WiFi日志数据生成器')
+    parser.add_argument('--dialect', default=DEFAULT_DIALECT, choices=['all'] + list(DIALECTS), help=f'日志方言，all 为每种方言各生成一个文件（默认：{DEFAULT_DIALECT}）')
+    parser.add_argument('-n', '--events', type=int, default=500, help='至少生成的事件数（默认：500）')
+    parser.add_argument('-o', '--output', default='../ussawifievent_optimized.txt', help='输出文件路径（默认：../ussawifievent_optimized.txt）')
     
-    # 生成至少500条事件
-    events = generator.generate_data(target_events=500)
+    args = parser.parse_args()
     
-    # 保存到文件
-    event_count, reason_counts = generator.save_to_file(events, "../ussawifievent_optimized.txt")
+    print("WiFi日志数据生成器")
+    print("=" * 50)
     
-    print(f"\n✅ 成功生成 {event_count} 条事件")
-    print(f"✅ 包含 {len(reason_counts)} 种不同的断连原因")
-    print(f"✅ 数据已保存到 ussawifievent_optimized.txt")
+    dialects = list(DIALECTS) if args.dialect == 'all' else [args.dialect]
+    for dialect in dialects:
+        output = args.output
+        if args.dialect == 'all':
+            root, ext = os.path.splitext(args.output)
+            output = f"{root}_{dialect}{ext}"
+        
+        generator = WiFiLogGenerator(dialect)
+        
+        # 生成至少指定条数的事件
+        events = generator.generate_data(target_events=args.events)
+        
+        # 保存到文件
+        event_count, reason_counts = generator.save_to_file(events, output)
+        
+        print(f"\n✅ 成功生成 {event_count} 条事件 (方言: {dialect})")
+        print(f"✅ 包含 {len(reason_counts)} 种不同的断连原因")
+        print(f"✅ 数据已保存到 {output}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+src 下的脚本以 `python xxx.py` 方式直接运行，模块搜索路径中只有 src 目录。
+导入本模块会把项目根目录(仅一次)追加到搜索路径末尾，使根目录下的共享模块
+(log_common、data_processor)可以被导入，且不会遮蔽其他同名模块。
+在项目根目录以 `from src.xxx import ...` 方式导入时，脚本改为导入 src.project_paths，效果相同。
+"""
+
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+客户端漫游与VAP转移矩阵分析脚本
+============================
+
+功能说明:
+- 在配对后的会话流上单次遍历，记录每个客户端从上一次断开的VAP(disassoc_vap)
+  到下一次连接的VAP(assoc_vap)的转移，以及两者之间的间隔秒数
+- VAP名称和客户端MAC驻留为整数ID，转移记录保存在整数数组中
+- 汇总为稀疏(COO)转移计数矩阵，附带每个单元格的平均/中位间隔
+- 多个AP日志按 (客户端, 时间) 归并后统一遍历，可以分析跨AP漫游
+- 转移明细和稀疏矩阵以列式 .npz 文件导出，可直接用 numpy 加载
+
+内存占用:
+- 每条转移固定 5 个 int64 (from, to, gap, client, epoch)，百万级转移约 40MB
+- 遍历期间只为每个客户端保留最近一次断开的 (VAP, 时间)
+- 多个AP日志逐个配对，每个日志的会话写成有序的紧凑二进制批次后立即释放该日志的事件，
+  同一时刻只有一个日志在配对(--max-memory 即总的配对内存预算)
+
+使用方法:
+    python roaming_analysis.py ../ussawifievent_optimized.txt
+    python roaming_analysis.py logs/ap1.txt logs/ap2.txt -o roaming --top 20
+    python roaming_analysis.py huge_wifi_log.txt --max-memory 512 --dedup-window 60
+
+输出结果:
+- 控制台漫游统计和转移最多的VAP对
+- {输出前缀}_roaming.npz: vap_names, from_vap, to_vap, gap_seconds, client_id, epoch,
+  matrix_from, matrix_to, matrix_count, matrix_gap_mean, matrix_gap_median
+
+注意:
+- 会话配对在单个AP日志内进行，与 fleet_analysis.py 一致
+- 多个日志文件时VAP名称为 "AP名:VAP"，AP名称取日志文件名(不含扩展名)
+- 间隔为负表示新连接先于旧连接的断开被记录(先连后断的漫游)
+"""
+
+import argparse
+import heapq
+import os
+import struct
+import tempfile
+from array import array
+from operator import itemgetter
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    import project_paths  # noqa: F401  项目根目录下的共享模块
+except ImportError:
+    from src import project_paths  # noqa: F401  在项目根目录以 src.xxx 方式导入时
+from data_processor import WiFiLogProcessor
+
+
+class Interner:
+    """字符串驻留：名称 <-> 连续整数ID"""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def intern(self, name):
+        identifier = self.ids.get(name)
+        if identifier is None:
+            identifier = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return identifier
+
+    def __len__(self):
+        return len(self.names)
+
+
+def vap_name(vap, ap=None):
+    return f"{ap}:{vap}" if ap else vap
+
+
+def session_record(session, ap=None):
+    """会话字典 -> (client, 排序时间, assoc_epoch, assoc_vap, disassoc_epoch, disassoc_vap)
+
+    缺失的一端 epoch 为 None；VAP 名称已带 AP 前缀。
+    """
+    assoc_epoch = session['assoc_epoch']
+    disassoc_epoch = session['disassoc_epoch']
+    return (session['client'], assoc_epoch if assoc_epoch is not None else disassoc_epoch,
+            assoc_epoch, vap_name(session['assoc_vap'], ap), disassoc_epoch, vap_name(session['disassoc_vap'], ap))
+
+
+class SessionRun:
+    """有序会话批次：按 (客户端, 时间) 顺序写入临时文件的紧凑二进制会话记录"""
+
+    # 排序时间, assoc_epoch, disassoc_epoch, flags, len(client), len(assoc_vap), len(disassoc_vap)
+    RECORD_HEADER = struct.Struct('<qqqBHHH')
+    HAS_ASSOC = 1
+    HAS_DISASSOC = 2
+
+    def __init__(self, temp_dir=None):
+        self.file = tempfile.TemporaryFile(dir=temp_dir)
+        self.count = 0
+
+    def write(self, record):
+        client, key_epoch, assoc_epoch, assoc_vap, disassoc_epoch, disassoc_vap = record
+        flags = ((self.HAS_ASSOC if assoc_epoch is not None else 0)
+                 | (self.HAS_DISASSOC if disassoc_epoch is not None else 0))
+        fields = [client.encode('utf-8'), assoc_vap.encode('utf-8'), disassoc_vap.encode('utf-8')]
+        self.file.write(self.RECORD_HEADER.pack(key_epoch, assoc_epoch or 0, disassoc_epoch or 0, flags,
+                                                *(len(field) for field in fields)))
+        self.file.write(b''.join(fields))
+        self.count += 1
+
+    def __iter__(self):
+        """从头按顺序读取，产出 session_record 格式的记录"""
+        self.file.seek(0)
+        read = self.file.read
+        header_size = self.RECORD_HEADER.size
+        while True:
+            header = read(header_size)
+            if not header:
+                break
+            key_epoch, assoc_epoch, disassoc_epoch, flags, *lengths = self.RECORD_HEADER.unpack(header)
+            client, assoc_vap, disassoc_vap = (read(length).decode('utf-8') for length in lengths)
+            yield (client, key_epoch,
+                   assoc_epoch if flags & self.HAS_ASSOC else None, assoc_vap,
+                   disassoc_epoch if flags & self.HAS_DISASSOC else None, disassoc_vap)
+
+    def close(self):
+        self.file.close()
+
+
+class TransitionMatrix(NamedTuple):
+    """稀疏(COO)VAP转移矩阵，每个非零单元格一行"""
+    from_vap: np.ndarray
+    to_vap: np.ndarray
+    count: np.ndarray
+    gap_mean: np.ndarray
+    gap_median: np.ndarray
+
+
+class RoamingAnalyzer:
+    """单次流式遍历会话，记录 disassoc_vap -> 下一次 assoc_vap 的转移
+
+    要求同一客户端的会话按时间顺序到达，不同客户端之间可以任意交错。
+    """
+
+    def __init__(self):
+        self.vaps = Interner()
+        self.clients = Interner()
+        self.from_vap = array('q')
+        self.to_vap = array('q')
+        self.gap_seconds = array('q')
+        self.client_id = array('q')
+        self.epoch = array('q')
+        self.last_disassoc = {}   # client_id -> (vap_id, epoch)
+        self.sessions = 0
+
+    def add(self, client, assoc_epoch, assoc_vap, disassoc_epoch, disassoc_vap):
+        """处理一个会话；缺失的一端 epoch 为 None"""
+        self.sessions += 1
+        client_id = self.clients.intern(client)
+
+        if assoc_epoch is not None:
+            previous = self.last_disassoc.pop(client_id, None)
+            if previous is not None:
+                self.from_vap.append(previous[0])
+                self.to_vap.append(self.vaps.intern(assoc_vap))
+                self.gap_seconds.append(assoc_epoch - previous[1])
+                self.client_id.append(client_id)
+                self.epoch.append(assoc_epoch)
+
+        if disassoc_epoch is not None:
+            self.last_disassoc[client_id] = (self.vaps.intern(disassoc_vap), disassoc_epoch)
+
+    def add_session(self, session, ap=None):
+        """处理一个会话记录(WiFiLogProcessor 产出的字典)"""
+        client, _, *fields = session_record(session, ap)
+        self.add(client, *fields)
+
+    def run(self, records):
+        """在 session_record 格式的记录流上运行，返回自身以便链式调用"""
+        for client, _, assoc_epoch, assoc_vap, disassoc_epoch, disassoc_vap in records:
+            self.add(client, assoc_epoch, assoc_vap, disassoc_epoch, disassoc_vap)
+        return self
+
+    def __len__(self):
+        return len(self.from_vap)
+
+    def columns(self):
+        """转移明细的 numpy 列"""
+        return {
+            'from_vap': np.frombuffer(self.from_vap, dtype=np.int64),
+            'to_vap': np.frombuffer(self.to_vap, dtype=np.int64),
+            'gap_seconds': np.frombuffer(self.gap_seconds, dtype=np.int64),
+            'client_id': np.frombuffer(self.client_id, dtype=np.int64),
+            'epoch': np.frombuffer(self.epoch, dtype=np.int64)
+        }
+
+    def transition_matrix(self):
+        """汇总为稀疏转移矩阵(按 from, to 排序)"""
+        columns = self.columns()
+        vap_count = max(len(self.vaps), 1)
+        cells = columns['from_vap'] * vap_count + columns['to_vap']
+
+        # 按 (单元格, 间隔) 排序后，每个单元格的间隔是连续且有序的一段
+        order = np.lexsort((columns['gap_seconds'], cells))
+        sorted_cells = cells[order]
+        sorted_gaps = columns['gap_seconds'][order]
+        keys, starts, counts = np.unique(sorted_cells, return_index=True, return_counts=True)
+
+        gap_sums = np.add.reduceat(sorted_gaps, starts) if len(starts) else np.zeros(0, dtype=np.int64)
+        return TransitionMatrix(
+            from_vap=keys // vap_count,
+            to_vap=keys % vap_count,
+            count=counts,
+            gap_mean=gap_sums / np.maximum(counts, 1),
+            gap_median=sorted_gaps[starts + (counts - 1) // 2]
+        )
+
+    def export(self, output_prefix, matrix=None):
+        """导出列式 .npz 文件，返回文件路径"""
+        matrix = matrix if matrix is not None else self.transition_matrix()
+        path = f"{output_prefix}_roaming.npz"
+        np.savez(path,
+                 vap_names=np.array(self.vaps.names, dtype=str),
+                 matrix_from=matrix.from_vap,
+                 matrix_to=matrix.to_vap,
+                 matrix_count=matrix.count,
+                 matrix_gap_mean=matrix.gap_mean,
+                 matrix_gap_median=matrix.gap_median,
+                 **self.columns())
+        return path
+
+
+# 同时打开的有序批次数上限，达到后先合并为一个批次
+MAX_OPEN_RUNS = 64
+
+
+def write_log_run(log_file, ap=None, max_memory=None, temp_dir=None, dedup_window=None):
+    """配对单个AP日志并把会话写成有序批次；返回时该日志的事件已释放"""
+    processor = WiFiLogProcessor(include_system_events=False, max_memory=max_memory,
+                                 temp_dir=temp_dir, dedup_window=dedup_window)
+    run = SessionRun(temp_dir)
+    try:
+        processor.process_file(log_file)
+        for session in processor.iter_client_sessions():
+            run.write(session_record(session, ap))
+    except BaseException:
+        run.close()
+        raise
+    finally:
+        processor.close()
+    return run
+
+
+def merge_runs(runs, temp_dir=None):
+    """把若干有序批次归并为一个"""
+    merged = SessionRun(temp_dir)
+    for record in heapq.merge(*runs, key=itemgetter(0, 1)):
+        merged.write(record)
+    for run in runs:
+        run.close()
+    return merged
+
+
+def iter_log_sessions(log_files, max_memory=None, temp_dir=None, dedup_window=None):
+    """逐个AP日志配对并写成有序批次，按 (客户端, 时间) 归并后产出 session_record 格式的记录"""
+    runs = []
+    try:
+        for log_file in log_files:
+            ap = os.path.splitext(os.path.basename(log_file))[0] if len(log_files) > 1 else None
+            runs.append(write_log_run(log_file, ap, max_memory=max_memory, temp_dir=temp_dir,
+                                      dedup_window=dedup_window))
+            if len(runs) >= MAX_OPEN_RUNS:
+                runs = [merge_runs(runs, temp_dir)]
+
+        yield from heapq.merge(*runs, key=itemgetter(0, 1))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def print_report(analyzer, matrix, top=10):
+    """打印漫游统计"""
+    names = analyzer.vaps.names
+    roams = matrix.from_vap != matrix.to_vap
+    roam_count = int(matrix.count[roams].sum())
+
+    print("\n=== 漫游统计 ===")
+    print(f"会话数: {analyzer.sessions}")
+    print(f"客户端数: {len(analyzer.clients)}, VAP数: {len(names)}")
+    print(f"断开后重新连接: {len(analyzer)} 次")
+    if len(analyzer):
+        print(f"  其中切换VAP(漫游): {roam_count} 次 ({roam_count / len(analyzer) * 100:.1f}%)")
+        print(f"  回到同一VAP: {len(analyzer) - roam_count} 次")
+    print(f"转移矩阵非零单元格: {len(matrix.count)}")
+
+    print(f"\n=== 转移最多的VAP对 (Top {top}) ===")
+    for i in np.argsort(-matrix.count, kind='stable')[:top]:
+        print(f"  {names[matrix.from_vap[i]]} -> {names[matrix.to_vap[i]]}: {matrix.count[i]}次, "
+              f"平均间隔 {matrix.gap_mean[i]:.0f}s, 中位间隔 {matrix.gap_median[i]}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='客户端漫游与VAP转移矩阵分析工具')
+    parser.add_argument('log_files', nargs='+', help='输入日志文件路径(多个文件视为多个AP)')
+    parser.add_argument('-o', '--output', default=None, help='列式结果输出前缀，生成 {前缀}_roaming.npz')
+    parser.add_argument('--top', type=int, default=10, help='显示转移最多的VAP对数量（默认：10）')
+    parser.add_argument('--max-memory', type=int, default=None, help='每个日志配对时的内存预算(MB)（默认：不限制）')
+    parser.add_argument('--temp-dir', default=None, help='溢写临时文件目录（默认：系统临时目录）')
+    parser.add_argument('--dedup-window', type=int, default=None, help='丢弃该秒数窗口内的重复客户端事件（默认：不去重）')
+
+    args = parser.parse_args()
+
+    max_memory = args.max_memory * 1024 * 1024 if args.max_memory else None
+    print(f"正在分析 {len(args.log_files)} 个日志文件的漫游...")
+    analyzer = RoamingAnalyzer().run(iter_log_sessions(args.log_files, max_memory=max_memory,
+                                                       temp_dir=args.temp_dir, dedup_window=args.dedup_window))
+    matrix = analyzer.transition_matrix()
+    print_report(analyzer, matrix, top=args.top)
+
+    if args.output:
+        print(f"\n结果已保存到: {analyzer.export(args.output, matrix)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WiFi断连风暴与客户端抖动(flapping)在线检测脚本
+=======================================
+
+功能说明:
+- 在解析后的事件流上在线运行，不需要等待整个文件分析完毕
+- 断连风暴: 某个VAP在滑动窗口内突然出现大量同类断连
+  (默认关注 Code 5 AP过载，以及 Code 15/23 认证失败)
+- 客户端抖动: 同一客户端在短时间内反复 assoc/disassoc
+- 每个事件的更新代价为 O(1)：
+  - 断连计数使用固定槽位的环形缓冲区滑动窗口
+  - 基线使用按槽位更新的EWMA(指数加权移动平均)
+  - 抖动检测使用每客户端定长环形队列，每个窗口清理一次窗口内没有事件的客户端，
+    长时间 --follow 运行时状态不随历史客户端数增长
+- 输出带时间戳的告警记录，可用于批量分析，也可用于实时跟踪日志
+
+使用方法:
+    # 批量检测
+    python storm_detector.py ../ussawifievent_optimized.txt
+
+    # 实时跟踪日志文件(类似 tail -f)
+    python storm_detector.py /var/log/ussawifievent.log --follow
+
+    # AP重传或日志转发导致的重复行，先在60秒窗口内去重
+    python storm_detector.py ../ussawifievent_optimized.txt --dedup-window 60
+
+告警记录字段:
+- timestamp: 触发告警的事件时间
+- alert_type: disconnect_storm / client_flapping
+- vap, client_mac, category, reason_codes
+- count: 窗口内事件数; baseline: 基线期望值
+- message: 可读描述
+"""
+
+import argparse
+import time
+from collections import deque
+
+from analyze_optimized_data import OptimizedWiFiAnalyzer
+
+
+class SlidingWindowCounter:
+    """固定槽位的环形缓冲区滑动窗口计数器，附带按槽位更新的EWMA基线"""
+
+    def __init__(self, window_seconds, slots, alpha):
+        self.slots = slots
+        self.slot_seconds = window_seconds / slots
+        self.alpha = alpha
+        self.counts = [0] * slots
+        self.total = 0
+        self.current_slot = None
+        self.baseline = 0.0  # 每个槽位的期望事件数
+
+    def add(self, epoch_seconds):
+        """记录一个事件，返回当前窗口内的事件总数"""
+        slot = int(epoch_seconds // self.slot_seconds)
+        self._advance(slot)
+        self.counts[self.current_slot % self.slots] += 1
+        self.total += 1
+        return self.total
+
+    def expected_window_count(self):
+        """基线对应的整个窗口期望事件数"""
+        return self.baseline * self.slots
+
+    def _advance(self, slot):
+        if self.current_slot is None:
+            self.current_slot = slot
+            return
+        gap = slot - self.current_slot
+        if gap <= 0:
+            # 同一槽位或轻微乱序的事件计入当前槽位
+            return
+
+        # 已结束的槽位更新EWMA：第一个是当前槽位，其余为空槽位
+        closed = self.counts[self.current_slot % self.slots]
+        self.baseline = self.alpha * closed + (1 - self.alpha) * self.baseline
+        if gap > 1:
+            self.baseline *= (1 - self.alpha) ** (gap - 1)
+
+        # 清空滑出窗口的槽位(最多清空一圈，每个事件均摊O(1))
+        for step in range(1, min(gap, self.slots) + 1):
+            index = (self.current_slot + step) % self.slots
+            self.total -= self.counts[index]
+            self.counts[index] = 0
+        self.current_slot = slot
+
+
+class DisconnectStormDetector:
+    """按 (VAP, 原因类别) 检测断连风暴"""
+
+    def __init__(self, window_seconds=300, slots=10, alpha=0.1, factor=3.0, min_count=5, watch_categories=None):
+        self.window_seconds = window_seconds
+        self.slots = slots
+        self.alpha = alpha
+        self.factor = factor
+        self.min_count = min_count
+
+        # 默认关注容量问题和认证问题
+        self.watch_categories = watch_categories or {
+            "Capacity Issues": [5],
+            "Auth Issues": [15, 23]
+        }
+        self.code_to_category = {}
+        for category, codes in self.watch_categories.items():
+            for code in codes:
+                self.code_to_category[code] = category
+
+        self.windows = {}   # (vap, category) -> SlidingWindowCounter
+        self.active = set() # 正在告警中的 (vap, category)，避免同一次风暴重复告警
+
+    def process(self, event, epoch_seconds):
+        """处理一个事件，触发告警时返回告警记录，否则返回None"""
+        if event['event_type'] != 'disassoc':
+            return None
+        category = self.code_to_category.get(event['reason_code'])
+        if category is None:
+            return None
+
+        key = (event['vap'], category)
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = SlidingWindowCounter(self.window_seconds, self.slots, self.alpha)
+
+        count = window.add(epoch_seconds)
+        expected = window.expected_window_count()
+        is_storm = count >= self.min_count and count >= self.factor * expected
+
+        if not is_storm:
+            self.active.discard(key)
+            return None
+        if key in self.active:
+            return None
+
+        self.active.add(key)
+        return {
+            'timestamp': event['timestamp'],
+            'alert_type': 'disconnect_storm',
+            'vap': event['vap'],
+            'client_mac': None,
+            'category': category,
+            'reason_codes': self.watch_categories[category],
+            'count': count,
+            'baseline': round(expected, 2),
+            'message': f"VAP {event['vap']} 在 {self.window_seconds}s 内出现 {count} 次 {category} 断连 "
+                       f"(基线 {expected:.1f})"
+        }
+
+
+class FlappingDetector:
+    """检测单个客户端在短时间内反复连接/断开"""
+
+    def __init__(self, window_seconds=600, threshold=6):
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self.recent = {}      # client_mac -> deque(最近threshold个事件的时间)
+        self.last_alert = {}  # client_mac -> 上次告警时间
+        self.next_sweep = None  # 下次清理过期客户端的事件时间
+
+    def process(self, event, epoch_seconds):
+        """处理一个事件，触发告警时返回告警记录，否则返回None"""
+        if event['event_type'] not in ('assoc', 'disassoc'):
+            return None
+
+        if self.next_sweep is None or epoch_seconds >= self.next_sweep:
+            self._sweep(epoch_seconds)
+
+        client_mac = event['client_mac']
+        recent = self.recent.get(client_mac)
+        if recent is None:
+            recent = self.recent[client_mac] = deque(maxlen=self.threshold)
+        recent.append(epoch_seconds)
+
+        if len(recent) < self.threshold or epoch_seconds - recent[0] > self.window_seconds:
+            return None
+
+        # 同一次抖动在一个窗口内只告警一次
+        last = self.last_alert.get(client_mac)
+        if last is not None and epoch_seconds - last <= self.window_seconds:
+            return None
+        self.last_alert[client_mac] = epoch_seconds
+
+        return {
+            'timestamp': event['timestamp'],
+            'alert_type': 'client_flapping',
+            'vap': event['vap'],
+            'client_mac': client_mac,
+            'category': None,
+            'reason_codes': [],
+            'count': len(recent),
+            'baseline': None,
+            'message': f"客户端 {client_mac} 在 {epoch_seconds - recent[0]:.0f}s 内出现 "
+                       f"{len(recent)} 次 assoc/disassoc"
+        }
+
+    def _sweep(self, epoch_seconds):
+        """丢弃最新事件和上次告警都早于一个窗口的客户端
+
+        这些旧时间已不可能与之后的事件落在同一窗口内，丢弃不影响告警结果。
+        """
+        horizon = epoch_seconds - self.window_seconds
+        self.recent = {client_mac: recent for client_mac, recent in self.recent.items() if recent[-1] >= horizon}
+        self.last_alert = {client_mac: last for client_mac, last in self.last_alert.items() if last >= horizon}
+        self.next_sweep = epoch_seconds + self.window_seconds
+
+
+class StreamingAlertStage:
+    """在线检测阶段：组合断连风暴检测和抖动检测"""
+
+    def __init__(self, storm_detector=None, flapping_detector=None):
+        self.storm_detector = storm_detector or DisconnectStormDetector()
+        self.flapping_detector = flapping_detector or FlappingDetector()
+        self.alert_count = 0
+
+    def process(self, event):
+        """处理一个解析后的事件，返回本事件触发的告警列表"""
+        alerts = []
+        epoch_seconds = event['timestamp'].timestamp()
+        for detector in (self.storm_detector, self.flapping_detector):
+            alert = detector.process(event, epoch_seconds)
+            if alert:
+                alerts.append(alert)
+        self.alert_count += len(alerts)
+        return alerts
+
+    def run(self, events):
+        """在事件流上运行检测，逐个产出告警记录"""
+        for event in events:
+            yield from self.process(event)
+
+
+def follow_log_events(analyzer, log_file, poll_interval=1.0):
+    """实时跟踪日志文件，逐个产出新写入行解析出的事件"""
+    with open(log_file, 'r', encoding='utf-8') as f:
+        line_num = 0
+        pending = ''
+        while True:
+            line = f.readline()
+            if not line:
+                time.sleep(poll_interval)
+                continue
+            if not line.endswith('\n'):
+                # 行尚未写完整，等待剩余部分
+                pending += line
+                continue
+
+            line_num += 1
+            line, pending = pending + line, ''
+            try:
+                yield from analyzer.parse_event_line(line, line_num)
+            except Exception as e:
+                print(f"解析第{line_num}行时出错: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WiFi断连风暴与客户端抖动在线检测工具')
+    parser.add_argument('log_file', help='输入日志文件路径')
+    parser.add_argument('--follow', action='store_true', help='实时跟踪日志文件的新增内容')
+    parser.add_argument('--storm-window', type=int, default=300, help='断连风暴滑动窗口秒数（默认：300）')
+    parser.add_argument('--storm-factor', type=float, default=3.0, help='超过基线多少倍视为风暴（默认：3.0）')
+    parser.add_argument('--storm-min-count', type=int, default=5, help='窗口内最少断连次数（默认：5）')
+    parser.add_argument('--flap-window', type=int, default=600, help='抖动检测窗口秒数（默认：600）')
+    parser.add_argument('--flap-threshold', type=int, default=6, help='窗口内assoc/disassoc次数阈值（默认：6）')
+    parser.add_argument('--dedup-window', type=int, default=None, help='丢弃该秒数窗口内的重复事件（默认：不去重）')
+
+    args = parser.parse_args()
+
+    stage = StreamingAlertStage(
+        DisconnectStormDetector(window_seconds=args.storm_window, factor=args.storm_factor,
+                                min_count=args.storm_min_count),
+        FlappingDetector(window_seconds=args.flap_window, threshold=args.flap_threshold)
+    )
+    analyzer = OptimizedWiFiAnalyzer(args.log_file, dedup_window=args.dedup_window)
+
+    if args.follow:
+        print(f"正在实时跟踪: {args.log_file} (Ctrl+C 退出)")
+        events = analyzer.drop_duplicates(follow_log_events(analyzer, args.log_file))
+    else:
+        print(f"正在检测: {args.log_file}")
+        events = analyzer.iter_log_events()
+
+    try:
+        for alert in stage.run(events):
+            print(f"[{alert['timestamp']}] {alert['alert_type']}: {alert['message']}")
+    except KeyboardInterrupt:
+        pass
+
+    print(f"\n共产生 {stage.alert_count} 条告警")
+    if args.dedup_window:
+        print(f"丢弃重复事件 {analyzer.duplicates_dropped} 个")
+
+
+if __name__ == "__main__":
+    main()
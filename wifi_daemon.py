@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WiFi日志常驻分析守护进程
+====================
+
+功能说明:
+- 持续跟踪一个或多个日志文件，增量解析和配对会话 (基于 WiFiSessionStream)
+- 在内存中维护:
+  - 每个客户端的会话状态和最近会话历史
+  - 按VAP索引的当前未断开连接
+  - 按reason code索引的最近断连
+  - 断连原因、VAP等累计汇总
+- 在本机UNIX域套接字和/或 127.0.0.1 HTTP 端口上回答查询，
+  查询只读取内存中的索引，不需要重新解析日志
+- 定期把状态快照到磁盘，重启时从快照和文件偏移量继续，无需全量重放
+
+只依赖Python标准库，启动时不导入pandas。
+
+使用方法:
+    # 启动守护进程
+    python wifi_daemon.py ussawifievent_optimized.txt --socket /tmp/wifi_daemon.sock --http-port 8765 --snapshot wifi_daemon.pkl
+
+    # 查询 (UNIX套接字)
+    python wifi_daemon.py --socket /tmp/wifi_daemon.sock --query open_sessions vap=rai4
+    python wifi_daemon.py --socket /tmp/wifi_daemon.sock --query recent_disconnects reason=5 limit=20
+    python wifi_daemon.py --socket /tmp/wifi_daemon.sock --query client mac=2e:55:b9:42:06:aa
+
+    # 查询 (HTTP)
+    curl 'http://127.0.0.1:8765/open_sessions?vap=rai4'
+
+支持的查询:
+- stats: 累计计数和汇总
+- open_sessions [vap=]: 当前未断开的连接
+- recent_disconnects [reason=] [limit=]: 最近的断连
+- client mac= [limit=]: 某个客户端的当前状态和最近会话
+"""
+
+import argparse
+import json
+import os
+import pickle
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter, deque
+from itertools import islice
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from data_processor import WiFiSessionStream
+
+# 每次持有索引锁时合并的会话记录数
+INDEX_BATCH = 256
+
+
+class DaemonState:
+    """守护进程的内存状态：会话配对状态、索引和汇总"""
+
+    def __init__(self, history=50, recent=1000, dedup_window=None):
+        self.history = history
+        self.recent = recent
+        self.stream = WiFiSessionStream(dedup_window=dedup_window)
+        # lock 只保护索引，查询和索引更新各自持有很短时间；
+        # ingest_lock 串行化解析和快照(状态只在喂入时改变)，解析和快照期间查询不受阻塞
+        self.lock = threading.Lock()
+        self.ingest_lock = threading.Lock()
+        self.counters = self.stream.counters()
+
+        self.offsets = {}                 # 日志文件 -> 已读取的字节偏移量
+        self.client_history = {}          # client -> deque(最近的会话)
+        self.recent_disconnects = deque(maxlen=recent)
+        self.recent_by_reason = {}        # reason_code -> deque(最近的断连)
+        self.reason_counts = Counter()
+        self.vap_disconnects = Counter()
+        self.open_by_vap = {}             # vap -> {client: 会话}
+        self.open_by_client = {}          # client -> 会话
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        del state['ingest_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.ingest_lock = threading.Lock()
+        if 'counters' not in state:
+            self.counters = self.stream.counters()
+
+    def ingest(self, log_file, data):
+        """喂入一个文件新读取的字节块，并更新索引"""
+        with self.ingest_lock:
+            # 解析和配对不持有索引锁，只在更新索引时短暂加锁
+            closed, opened = self.stream.feed_bytes(data, with_opened=True)
+            closed = [session._asdict() for session in closed]
+            opened = [session._asdict() for session in opened]
+            counters = self.stream.counters()
+            # 先合并关闭的会话，再加入本批结束时仍未断开的新连接；
+            # 分片更新索引，每次持锁时间与分片大小相关，与块大小无关
+            for update, records in ((self.add_closed, closed), (self.add_opened, opened)):
+                for start in range(0, len(records), INDEX_BATCH):
+                    with self.lock:
+                        update(records[start:start + INDEX_BATCH])
+            with self.lock:
+                self.counters = counters
+                self.offsets[log_file] = self.offsets.get(log_file, 0) + len(data)
+
+    def rewind(self, log_file):
+        """文件被截断或轮转时把偏移量重置为0"""
+        with self.ingest_lock, self.lock:
+            self.offsets[log_file] = 0
+
+    def add_opened(self, records):
+        """把新的未断开连接加入索引，调用方持有 self.lock"""
+        for record in records:
+            self.open_by_client[record['client']] = record
+            self.open_by_vap.setdefault(record['assoc_vap'], {})[record['client']] = record
+
+    def add_closed(self, records):
+        """按顺序把关闭的会话合并进索引，调用方持有 self.lock"""
+        for record in records:
+            client = record['client']
+            open_record = self.open_by_client.pop(client, None)
+            if open_record is not None:
+                vap_clients = self.open_by_vap[open_record['assoc_vap']]
+                del vap_clients[client]
+                if not vap_clients:
+                    del self.open_by_vap[open_record['assoc_vap']]
+
+            history = self.client_history.get(client)
+            if history is None:
+                history = self.client_history[client] = deque(maxlen=self.history)
+            history.append(record)
+
+            reason_code = record['reason_code']
+            self.recent_disconnects.append(record)
+            by_reason = self.recent_by_reason.get(reason_code)
+            if by_reason is None:
+                by_reason = self.recent_by_reason[reason_code] = deque(maxlen=self.recent)
+            by_reason.append(record)
+            self.reason_counts[reason_code] += 1
+            self.vap_disconnects[record['disassoc_vap']] += 1
+
+    def query(self, name, params):
+        """回答一个查询，返回可JSON序列化的结果"""
+        limit = int(params.get('limit', 100))
+        with self.lock:
+            if name == 'stats':
+                return {
+                    'counters': self.counters._asdict(),
+                    'open_sessions': len(self.open_by_client),
+                    'open_by_vap': {vap: len(clients) for vap, clients in self.open_by_vap.items()},
+                    'reason_counts': dict(self.reason_counts),
+                    'vap_disconnects': dict(self.vap_disconnects),
+                    'files': dict(self.offsets)
+                }
+            if name == 'open_sessions':
+                vap = params.get('vap')
+                sessions = self.open_by_vap.get(vap, {}) if vap else self.open_by_client
+                return {'count': len(sessions), 'sessions': list(islice(sessions.values(), limit))}
+            if name == 'recent_disconnects':
+                reason = params.get('reason')
+                source = self.recent_by_reason.get(reason, ()) if reason else self.recent_disconnects
+                return {'sessions': list(source)[-limit:][::-1]}
+            if name == 'client':
+                mac = params.get('mac', '')
+                history = self.client_history.get(mac, ())
+                return {
+                    'client': mac,
+                    'open_session': self.open_by_client.get(mac),
+                    'sessions': list(history)[-limit:][::-1]
+                }
+        raise ValueError(f"未知查询: {name}")
+
+    def save_snapshot(self, path):
+        """原子地把状态写入快照文件"""
+        # 快照期间暂停喂入，索引和偏移量保持一致；查询只读索引，不受影响
+        with self.ingest_lock:
+            data = pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load_snapshot(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+class LogFollower(threading.Thread):
+    """后台线程：从上次偏移量开始持续读取日志文件的新增内容"""
+
+    def __init__(self, state, log_files, poll_interval=0.5, chunk_size=1 << 18):
+        super().__init__(daemon=True)
+        self.state = state
+        self.log_files = log_files
+        self.poll_interval = poll_interval
+        self.chunk_size = chunk_size
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            idle = True
+            for log_file in self.log_files:
+                if self.read_new_data(log_file):
+                    idle = False
+            if idle:
+                self.stop_event.wait(self.poll_interval)
+
+    def read_new_data(self, log_file):
+        try:
+            size = os.path.getsize(log_file)
+        except OSError:
+            return False
+
+        offset = self.state.offsets.get(log_file, 0)
+        if size < offset:
+            # 文件被截断或轮转，从头开始读取
+            self.state.rewind(log_file)
+            offset = 0
+        if size == offset:
+            return False
+
+        with open(log_file, 'rb') as f:
+            f.seek(offset)
+            data = f.read(self.chunk_size)
+        # 只喂入完整的行，未写完的半行留到下次读取，多个文件之间不会串行
+        end = data.rfind(b'\n')
+        if end < 0 and len(data) < self.chunk_size:
+            return False
+        if end >= 0:
+            data = data[:end + 1]
+        self.state.ingest(log_file, data)
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class QueryHandler(socketserver.StreamRequestHandler):
+    """UNIX套接字查询：每行一个JSON请求 {"query": ..., 参数...}，每行一个JSON响应"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                name = request.pop('query')
+                response = {'ok': True, 'result': self.server.state.query(name, request)}
+            except Exception as e:
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class UnixQueryServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, state):
+        self.state = state
+        super().__init__(path, QueryHandler)
+
+
+class HTTPQueryHandler(BaseHTTPRequestHandler):
+    """HTTP查询：GET /<查询名>?参数=值"""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            result = self.server.state.query(url.path.strip('/') or 'stats', dict(parse_qsl(url.query)))
+            status, body = 200, {'ok': True, 'result': result}
+        except Exception as e:
+            status, body = 400, {'ok': False, 'error': str(e)}
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HTTPQueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port, state):
+        self.state = state
+        super().__init__(('127.0.0.1', port), HTTPQueryHandler)
+
+
+def query_daemon(socket_path, name, **params):
+    """通过UNIX套接字向守护进程发送一个查询"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(dict(params, query=name)).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as f:
+            response = json.loads(f.readline())
+    if not response['ok']:
+        raise ValueError(response['error'])
+    return response['result']
+
+
+def run_daemon(args):
+    state = None
+    if args.snapshot and os.path.exists(args.snapshot):
+        state = DaemonState.load_snapshot(args.snapshot)
+        print(f"已从快照恢复: {args.snapshot} ({len(state.open_by_client)} 个未断开连接)")
+    if state is None:
+        state = DaemonState(history=args.history, recent=args.recent, dedup_window=args.dedup_window)
+
+    follower = LogFollower(state, args.log_files)
+    follower.start()
+
+    servers = []
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        servers.append(UnixQueryServer(args.socket, state))
+        print(f"UNIX套接字: {args.socket}")
+    if args.http_port:
+        servers.append(HTTPQueryServer(args.http_port, state))
+        print(f"HTTP: http://127.0.0.1:{args.http_port}/")
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # SIGTERM 与 Ctrl+C 一样，退出前保存快照
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    print(f"正在跟踪 {len(args.log_files)} 个日志文件 (Ctrl+C 退出)")
+    try:
+        while True:
+            time.sleep(args.snapshot_interval if args.snapshot else 3600)
+            if args.snapshot:
+                state.save_snapshot(args.snapshot)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        follower.stop()
+        follower.join()
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+        if args.snapshot:
+            state.save_snapshot(args.snapshot)
+            print(f"状态已保存到: {args.snapshot}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WiFi日志常驻分析守护进程')
+    parser.add_argument('log_files', nargs='*', help='要持续跟踪的日志文件')
+    parser.add_argument('--socket', default=None, help='UNIX域套接字路径')
+    parser.add_argument('--http-port', type=int, default=None, help='本机HTTP查询端口（仅监听127.0.0.1）')
+    parser.add_argument('--snapshot', default=None, help='状态快照文件路径，启动时从中恢复')
+    parser.add_argument('--snapshot-interval', type=int, default=60, help='快照间隔秒数（默认：60）')
+    parser.add_argument('--history', type=int, default=50, help='每个客户端保留的最近会话数（默认：50）')
+    parser.add_argument('--recent', type=int, default=1000, help='保留的最近断连数（默认：1000）')
+    parser.add_argument('--dedup-window', type=int, default=None, help='丢弃该秒数窗口内的重复客户端事件（默认：不去重）')
+    parser.add_argument('--query', nargs='+', metavar='NAME [key=value ...]', help='作为客户端发送查询后退出')
+
+    args = parser.parse_args()
+
+    if args.query:
+        if not args.socket:
+            parser.error('--query 需要同时指定 --socket')
+        name, pairs = args.query[0], args.query[1:]
+        params = dict(pair.split('=', 1) for pair in pairs)
+        print(json.dumps(query_daemon(args.socket, name, **params), ensure_ascii=False, indent=2))
+        return
+
+    if not args.log_files:
+        parser.error('需要至少一个日志文件')
+    if not args.socket and not args.http_port:
+        parser.error('需要指定 --socket 或 --http-port')
+    run_daemon(args)
+
+
+if __name__ == "__main__":
+    main()